@@ -17,6 +17,7 @@ sys.path.append(str(Path(__file__).parent))
 # ✅ ИСПРАВЛЕНО: Правильные импорты с относительными путями
 from .src.document_processor import DocumentProcessor
 from .src.config import settings
+from .src.data.loaders import get_http_session
 
 
 class DocumentLoader:
@@ -50,7 +51,7 @@ class DocumentLoader:
         """
         self.logger.info(f"Загружаем данные с: {url}")
 
-        response = requests.get(url, timeout=30)
+        response = get_http_session().get(url, timeout=30)
         response.raise_for_status()
         data = response.json()
 
@@ -1,6 +1,6 @@
 import json
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request
 import tempfile
 import os
 import sys
@@ -12,12 +12,14 @@ from .faiss_loader import load_documents_from_url
 from .client_info_service import ClientInfoService
 from .src.document_processor import DocumentProcessor, create_multimodal_processor, create_text_processor  # ✅ НОВЫЕ импорты
 from .src.config import settings
-import requests
+from .src.data.loaders import get_http_session
+from .src.json_response import json_response as _json, loads as _loads
 
 
 bp = Blueprint('faiss', __name__)
 logger = logging.getLogger(__name__)
 
+
 try:
     from .src.search.smart_search import SmartSearchEngine, SearchConfig
     SMART_SEARCH_AVAILABLE = True
@@ -26,6 +28,27 @@ except ImportError as e:
     SMART_SEARCH_AVAILABLE = False
     print(f"⚠️ Умный поиск недоступен: {e}")
 
+def _load_json():
+    """
+    Тело запроса как JSON ({} для пустого тела)
+
+    Тело читается без сохранения в запросе, разбор — orjson, если установлен
+
+    Returns:
+        (данные, None) или (None, ответ 400), если тело не является JSON-объектом
+    """
+    body = request.get_data(cache=False)
+    if not body:
+        return {}, None
+    try:
+        data = _loads(body)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return None, _json({"success": False, "error": "Нет данных в запросе"}, 400)
+    return data, None
+
+
 @bp.route("/faiss/index", methods=["GET"])
 def index():
     return {"status": "ok faiss index"}
@@ -35,7 +58,9 @@ def index():
 def search():
     """Поиск с поддержкой умного режима"""
     try:
-        data = request.json
+        data, error_response = _load_json()
+        if error_response is not None:
+            return error_response
         client_id = data.get("client_id")
         object_id = data.get("object_id")
         query = data.get("query", "")
@@ -43,10 +68,10 @@ def search():
         k = data.get("k", 5)
 
         if not client_id or not query:
-            return jsonify({
+            return _json({
                 "status": "error",
                 "error": "Требуется client_id и query"
-            }), 400
+            }, 400)
 
         # Создаем процессор
         processor = DocumentProcessor(client_id=client_id)
@@ -85,7 +110,7 @@ def search():
                 }
                 formatted_results.append(formatted_result)
 
-            return jsonify({
+            return _json({
                 "status": "ok",
                 "client_id": client_id,
                 "query": query,
@@ -114,7 +139,7 @@ def search():
                 }
                 formatted_results.append(formatted_result)
 
-            return jsonify({
+            return _json({
                 "status": "ok",
                 "client_id": client_id,
                 "query": query,
@@ -125,10 +150,10 @@ def search():
             })
 
     except Exception as e:
-        return jsonify({
+        return _json({
             "status": "error",
             "error": str(e)
-        }), 500
+        }, 500)
 
 
 
@@ -136,7 +161,9 @@ def search():
 def create_index():
     """Создание индекса с автоопределением режима"""
     try:
-        data = request.get_json()
+        data, error_response = _load_json()
+        if error_response is not None:
+            return error_response
         client_id = data["client_id"]
         enable_visual = True  # ✅ НОВОЕ: опциональный параметр
 
@@ -157,39 +184,41 @@ def create_index():
                     "chunked": result['chunked']
                 }
             }
-        return jsonify({
+        return _json({
             "success": False,
             "error": result['error'],
             "error_type": "processing_error"
-        }), 400
+        }, 400)
 
     except Exception as e:
         error_msg = f"Ошибка обработки документов: {str(e)}"
-        return jsonify({
+        return _json({
             "success": False,
             "error": error_msg,
             "error_type": "internal_error"
-        }), 500
+        }, 500)
 
 
 @bp.route("/faiss/get_index", methods=["GET"])
 def get_index():
     try:
-        data = request.get_json()
+        data, error_response = _load_json()
+        if error_response is not None:
+            return error_response
         client_id = data["client_id"]
 
         # Создаем сервис и получаем информацию
         service = ClientInfoService()
         result = service.get_client_info(client_id)
 
-        return jsonify(result)
+        return _json(result)
     except KeyError:
-        return jsonify({
+        return _json({
             'success': False,
             'error': 'Не указан client_id в запросе'
         })
     except Exception as e:
-        return jsonify({
+        return _json({
             'success': False,
             'error': f'Ошибка при получении данных: {str(e)}'
         })
@@ -198,11 +227,13 @@ def get_index():
 def search_multimodal():
     """Мультимодальный поиск с поддержкой текста и изображений"""
     try:
-        data = request.json
+        data, error_response = _load_json()
+        if error_response is not None:
+            return error_response
         client_id = data.get("client_id")
 
         if not client_id:
-            return jsonify({"error": "Требуется client_id"}), 400
+            return _json({"error": "Требуется client_id"}, 400)
 
         # Создаем процессор с автоопределением режима
         processor = DocumentProcessor(client_id=client_id)
@@ -231,12 +262,12 @@ def search_multimodal():
             )
 
         else:
-            return jsonify({
+            return _json({
                 "error": f"Неподдерживаемый режим поиска: {search_mode}",
                 "available_modes": ["text", "visual_description"] if processor.enable_visual_search else ["text"]
-            }), 400
+            }, 400)
 
-        return jsonify({
+        return _json({
             "success": True,
             "client_id": client_id,
             "query": text_query,
@@ -247,10 +278,10 @@ def search_multimodal():
         })
 
     except Exception as e:
-        return jsonify({
+        return _json({
             "success": False,
             "error": str(e)
-        }), 500
+        }, 500)
 
 @bp.route("/faiss/search_similar_images", methods=["POST"])
 def search_similar_images():
@@ -258,15 +289,15 @@ def search_similar_images():
     try:
         client_id = request.form.get("client_id")
         if not client_id:
-            return jsonify({"error": "Требуется client_id"}), 400
+            return _json({"error": "Требуется client_id"}, 400)
 
         # Проверяем загруженное изображение
         if 'image' not in request.files:
-            return jsonify({"error": "Необходимо загрузить изображение"}), 400
+            return _json({"error": "Необходимо загрузить изображение"}, 400)
 
         file = request.files['image']
         if file.filename == '':
-            return jsonify({"error": "Файл не выбран"}), 400
+            return _json({"error": "Файл не выбран"}, 400)
 
         # Параметры поиска
         k = int(request.form.get('k', 5))
@@ -276,10 +307,10 @@ def search_similar_images():
         processor = DocumentProcessor(client_id=client_id)
 
         if not processor.enable_visual_search:
-            return jsonify({
+            return _json({
                 "error": "Мультимодальный поиск недоступен для этого клиента",
                 "suggestion": "Создайте индекс с enable_visual_search=true"
-            }), 503
+            }, 503)
 
         # Сохраняем временный файл
         with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
@@ -297,7 +328,7 @@ def search_similar_images():
             # Анализируем загруженное изображение
             analysis = processor.get_image_analysis(temp_path)
 
-            return jsonify({
+            return _json({
                 "success": True,
                 "client_id": client_id,
                 "uploaded_image_analysis": analysis,
@@ -310,21 +341,23 @@ def search_similar_images():
             temp_path.unlink(missing_ok=True)
 
     except Exception as e:
-        return jsonify({
+        return _json({
             "success": False,
             "error": str(e)
-        }), 500
+        }, 500)
 
 @bp.route("/faiss/search_by_description", methods=["POST"])
 def search_by_description():
     """Поиск изображений по текстовому описанию"""
     try:
-        data = request.json
+        data, error_response = _load_json()
+        if error_response is not None:
+            return error_response
         client_id = data.get("client_id")
         description = data.get("description")
 
         if not client_id or not description:
-            return jsonify({"error": "Требуются client_id и description"}), 400
+            return _json({"error": "Требуются client_id и description"}, 400)
 
         # Создаем процессор
         processor = DocumentProcessor(client_id=client_id)
@@ -342,7 +375,7 @@ def search_by_description():
             )
             search_mode = "visual_description"
 
-        return jsonify({
+        return _json({
             "success": True,
             "client_id": client_id,
             "description": description,
@@ -353,10 +386,10 @@ def search_by_description():
         })
 
     except Exception as e:
-        return jsonify({
+        return _json({
             "success": False,
             "error": str(e)
-        }), 500
+        }, 500)
 
 
 @bp.route("/faiss/analyze_image", methods=["POST"])
@@ -366,7 +399,7 @@ def analyze_image():
         client_id = request.form.get("client_id", "temp")
 
         if 'image' not in request.files:
-            return jsonify({"error": "Необходимо загрузить изображение"}), 400
+            return _json({"error": "Необходимо загрузить изображение"}, 400)
 
         file = request.files['image']
 
@@ -374,11 +407,11 @@ def analyze_image():
         try:
             processor = create_multimodal_processor(client_id)
         except Exception as e:
-            return jsonify({
+            return _json({
                 "error": "Анализ изображений недоступен",
                 "details": str(e),
                 "suggestion": "Убедитесь, что установлены torch и CLIP"
-            }), 503
+            }, 503)
 
         # Сохраняем временный файл
         with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
@@ -389,7 +422,7 @@ def analyze_image():
             # Анализируем изображение
             analysis = processor.get_image_analysis(temp_path)
 
-            return jsonify({
+            return _json({
                 "success": True,
                 "filename": file.filename,
                 "analysis": analysis
@@ -400,10 +433,10 @@ def analyze_image():
             temp_path.unlink(missing_ok=True)
 
     except Exception as e:
-        return jsonify({
+        return _json({
             "success": False,
             "error": str(e)
-        }), 500
+        }, 500)
 
 
 @bp.route("/faiss/client_capabilities", methods=["GET"])
@@ -412,7 +445,7 @@ def get_client_capabilities():
     try:
         client_id = request.args.get("client_id")
         if not client_id:
-            return jsonify({"error": "Требуется client_id"}), 400
+            return _json({"error": "Требуется client_id"}, 400)
 
         # Создаем процессор с автоопределением режима
         processor = DocumentProcessor(client_id=client_id)
@@ -421,7 +454,7 @@ def get_client_capabilities():
         mode_info = processor.get_processing_mode_info()
         stats = processor.get_index_statistics()
 
-        return jsonify({
+        return _json({
             "success": True,
             "client_id": client_id,
             "processing_mode": mode_info,
@@ -444,17 +477,19 @@ def get_client_capabilities():
         })
 
     except Exception as e:
-        return jsonify({
+        return _json({
             "success": False,
             "error": str(e)
-        }), 500
+        }, 500)
 
 
 @bp.route("/faiss/create_multimodal_index", methods=["POST"])
 def create_multimodal_index():
     """Создает новый индекс с явной поддержкой мультимодальности"""
     try:
-        data = request.json
+        data, error_response = _load_json()
+        if error_response is not None:
+            return error_response
         client_id = data["client_id"]
         enable_visual = True
 
@@ -466,11 +501,11 @@ def create_multimodal_index():
             try:
                 processor = create_multimodal_processor(client_id)
             except Exception as e:
-                return jsonify({
+                return _json({
                     "success": False,
                     "error": f"Не удалось создать мультимодальный процессор: {str(e)}",
                     "suggestion": "Убедитесь, что установлены torch и CLIP"
-                }), 503
+                }, 503)
         else:
             processor = create_text_processor(client_id)
 
@@ -490,7 +525,7 @@ def create_multimodal_index():
             stats = processor.get_index_statistics()
             mode_info = processor.get_processing_mode_info()
 
-            return jsonify({
+            return _json({
                 "status": "ok",
                 "client_id": client_id,
                 "multimodal_enabled": enable_visual,
@@ -507,17 +542,17 @@ def create_multimodal_index():
                 "capabilities": mode_info['capabilities']
             })
         else:
-            return jsonify({
+            return _json({
                 "success": False,
                 "error": result.get('error', 'Неизвестная ошибка'),
                 "details": result
-            }), 400
+            }, 400)
 
     except Exception as e:
-        return jsonify({
+        return _json({
             "success": False,
             "error": f"Ошибка создания индекса: {str(e)}"
-        }), 500
+        }, 500)
 
 @bp.route("/faiss/delete_client", methods=["POST"])
 def delete_client():
@@ -530,13 +565,15 @@ def delete_client():
     """
     try:
         # Получаем данные из запроса
-        data = request.get_json()
+        data, error_response = _load_json()
+        if error_response is not None:
+            return error_response
         if not data or 'client_id' not in data:
-            return jsonify({
+            return _json({
                 'success': False,
                 'error': 'Не указан client_id в запросе',
                 'error_type': 'missing_parameter'
-            }), 400
+            }, 400)
 
         client_id = data['client_id']
         logger.info(f"🧹 Запрос на удаление данных клиента: {client_id}")
@@ -550,7 +587,7 @@ def delete_client():
 
         # Проверяем существование данных
         if not client_docs_path.exists() and not client_faiss_path.exists():
-            return jsonify({
+            return _json({
                 'success': False,
                 'error': f'Нет данных для клиента {client_id}',
                 'error_type': 'client_not_found',
@@ -558,7 +595,7 @@ def delete_client():
                     'documents': str(client_docs_path),
                     'faiss_index': str(client_faiss_path)
                 }
-            }), 404
+            }, 404)
 
         # Собираем статистику ДО удаления
         stats_before = {}
@@ -648,16 +685,16 @@ def delete_client():
 
         logger.info(f"🎉 Удаление для {client_id} завершено: {'успешно' if success else 'с ошибками'}")
 
-        return jsonify(result), status_code
+        return _json(result, status_code)
 
     except Exception as e:
         error_msg = f"Критическая ошибка при удалении данных клиента: {str(e)}"
         logger.error(error_msg)
-        return jsonify({
+        return _json({
             'success': False,
             'error': error_msg,
             'error_type': 'internal_error'
-        }), 500
+        }, 500)
 
 @bp.route("/faiss/update_client", methods=["POST"])
 def update_client():
@@ -665,66 +702,71 @@ def update_client():
     Обновляет клиента: вызывает /faiss/delete_client и /faiss/create_multimodal_index
     """
     try:
-        data = request.get_json()
+        data, error_response = _load_json()
+        if error_response is not None:
+            return error_response
         client_id = data.get("client_id")
         enable_visual = True
 
         if not client_id:
-            return jsonify({"success": False, "error": "client_id обязателен"}), 400
+            return _json({"success": False, "error": "client_id обязателен"}, 400)
 
         base_url = "http://localhost:8000/faiss"  # ⚠️ смотри чтобы совпадало с твоим хостом/портом
 
         # 1. Удаление
-        delete_resp = requests.post(f"{base_url}/delete_client", json={"client_id": client_id})
+        http = get_http_session()
+        delete_resp = http.post(f"{base_url}/delete_client", json={"client_id": client_id})
         delete_json = delete_resp.json()
 
         # 2. Создание нового индекса
-        create_resp = requests.post(f"{base_url}/create_multimodal_index", json={
+        create_resp = http.post(f"{base_url}/create_multimodal_index", json={
             "client_id": client_id,
             "enable_visual_search": enable_visual
         })
         create_json = create_resp.json()
 
-        return jsonify({
+        return _json({
             "success": True,
             "client_id": client_id,
             "delete_phase": delete_json,
             "create_phase": create_json,
             "message": f"Клиент {client_id} успешно обновлён"
-        }), 200
+        }, 200)
 
     except Exception as e:
-        return jsonify({
+        return _json({
             "success": False,
             "error": f"Ошибка при обновлении клиента: {e}"
-        }), 500
+        }, 500)
 
 
 @bp.route("/faiss/find_similar_to_existing", methods=["POST"])
 def find_similar_to_existing():
     """Поиск изображений, похожих на уже существующее в индексе"""
     try:
-        data = request.json
+        data, error_response = _load_json()
+        if error_response is not None:
+            return error_response
         client_id = data.get("client_id")
         source_file = data.get("source_file")
         k = data.get("k", 5)
 
         if not client_id or not source_file:
-            return jsonify({"error": "Требуются client_id и source_file"}), 400
+            return _json({"error": "Требуются client_id и source_file"}, 400)
 
         # Создаем процессор
         processor = DocumentProcessor(client_id=client_id)
 
         if not processor.enable_visual_search:
-            return jsonify({
+            return _json({
                 "error": "Визуальный поиск недоступен для этого клиента",
                 "suggestion": "Создайте индекс с enable_visual_search=true"
-            }), 503
+            }, 503)
 
         # Ищем похожие
         results = processor.get_similar_to_existing(source_file, k=k)
 
-        return jsonify({
+        return _json({
             "success": True,
             "client_id": client_id,
             "source_file": source_file,
@@ -733,10 +775,10 @@ def find_similar_to_existing():
         })
 
     except Exception as e:
-        return jsonify({
+        return _json({
             "success": False,
             "error": str(e)
-        }), 500
+        }, 500)
 
 
 @bp.route("/faiss/search_combined", methods=["POST"])
@@ -750,7 +792,7 @@ def search_combined():
         k = int(request.form.get("k", 5))
 
         if not client_id:
-            return jsonify({"error": "Требуется client_id"}), 400
+            return _json({"error": "Требуется client_id"}, 400)
 
         # Создаем процессор
         processor = DocumentProcessor(client_id=client_id)
@@ -759,14 +801,14 @@ def search_combined():
             # Fallback на текстовый поиск
             if text_query:
                 results = processor.search_documents(text_query, k=k)
-                return jsonify({
+                return _json({
                     "success": True,
                     "client_id": client_id,
                     "search_mode": "text_only_fallback",
                     "results": results
                 })
             else:
-                return jsonify({"error": "Мультимодальный поиск недоступен, требуется text_query"}), 400
+                return _json({"error": "Мультимодальный поиск недоступен, требуется text_query"}, 400)
 
         image_query_path = None
 
@@ -788,7 +830,7 @@ def search_combined():
                 text_weight=text_weight
             )
 
-            return jsonify({
+            return _json({
                 "success": True,
                 "client_id": client_id,
                 "text_query": text_query,
@@ -805,50 +847,52 @@ def search_combined():
                 Path(image_query_path).unlink(missing_ok=True)
 
     except Exception as e:
-        return jsonify({
+        return _json({
             "success": False,
             "error": str(e)
-        }), 500
+        }, 500)
 
 
 @bp.route("/faiss/export_visual_vectors", methods=["POST"])
 def export_visual_vectors():
     """Экспорт визуальных векторов клиента"""
     try:
-        data = request.json
+        data, error_response = _load_json()
+        if error_response is not None:
+            return error_response
         client_id = data.get("client_id")
 
         if not client_id:
-            return jsonify({"error": "Требуется client_id"}), 400
+            return _json({"error": "Требуется client_id"}, 400)
 
         # Создаем процессор
         processor = DocumentProcessor(client_id=client_id)
 
         if not processor.enable_visual_search:
-            return jsonify({
+            return _json({
                 "error": "Визуальные векторы недоступны для этого клиента"
-            }), 400
+            }, 400)
 
         # Экспортируем векторы
         export_data = processor.faiss_manager.export_visual_vectors()
 
         if 'error' in export_data:
-            return jsonify({
+            return _json({
                 "success": False,
                 "error": export_data['error']
-            }), 400
+            }, 400)
 
-        return jsonify({
+        return _json({
             "success": True,
             "client_id": client_id,
             "export_data": export_data
         })
 
     except Exception as e:
-        return jsonify({
+        return _json({
             "success": False,
             "error": str(e)
-        }), 500
+        }, 500)
 
 
 # Вспомогательные endpoint'ы для отладки и мониторинга
@@ -861,7 +905,7 @@ def health_check():
 
         dependencies = check_dependencies()
 
-        return jsonify({
+        return _json({
             "success": True,
             "system_status": "healthy",
             "dependencies": dependencies,
@@ -874,11 +918,11 @@ def health_check():
         })
 
     except Exception as e:
-        return jsonify({
+        return _json({
             "success": False,
             "system_status": "unhealthy",
             "error": str(e)
-        }), 500
+        }, 500)
 
 @bp.route("/faiss/materials", methods=["GET"])
 def get_materials():
@@ -891,10 +935,10 @@ def get_materials():
         category = request.args.get('category')  # Фильтр по категории
 
         if not client_id:
-            return jsonify({
+            return _json({
                 "status": "error",
                 "error": "Требуется client_id"
-            }), 400
+            }, 400)
 
         processor = DocumentProcessor(client_id=client_id)
 
@@ -902,7 +946,7 @@ def get_materials():
         all_chunks = processor.faiss_manager.get_all_chunks()
 
         if not all_chunks:
-            return jsonify({
+            return _json({
                 "status": "ok",
                 "client_id": client_id,
                 "total_chunks": 0,
@@ -961,7 +1005,7 @@ def get_materials():
             }
             materials.append(material)
 
-        return jsonify({
+        return _json({
             "status": "ok",
             "client_id": client_id,
             "total_chunks": total_chunks,
@@ -981,10 +1025,10 @@ def get_materials():
         })
 
     except Exception as e:
-        return jsonify({
+        return _json({
             "status": "error",
             "error": str(e)
-        }), 500
+        }, 500)
 
 
 @bp.route("/faiss/materials/summary", methods=["GET"])
@@ -994,10 +1038,10 @@ def get_materials_summary():
         client_id = request.args.get('client_id')
 
         if not client_id:
-            return jsonify({
+            return _json({
                 "status": "error",
                 "error": "Требуется client_id"
-            }), 400
+            }, 400)
 
         processor = DocumentProcessor(client_id=client_id)
 
@@ -1005,7 +1049,7 @@ def get_materials_summary():
         stats = processor.get_index_statistics()
 
         if stats.get('status') != 'ready':
-            return jsonify({
+            return _json({
                 "status": "ok",
                 "client_id": client_id,
                 "index_status": stats.get('status', 'not_ready'),
@@ -1092,7 +1136,7 @@ def get_materials_summary():
             "index_stats": stats
         }
 
-        return jsonify({
+        return _json({
             "status": "ok",
             "client_id": client_id,
             "index_status": "ready",
@@ -1100,10 +1144,10 @@ def get_materials_summary():
         })
 
     except Exception as e:
-        return jsonify({
+        return _json({
             "status": "error",
             "error": str(e)
-        }), 500
+        }, 500)
 
 
 @bp.route("/faiss/materials/file/<path:filename>", methods=["GET"])
@@ -1113,16 +1157,16 @@ def get_file_materials(filename):
         client_id = request.args.get('client_id')
 
         if not client_id:
-            return jsonify({
+            return _json({
                 "status": "error",
                 "error": "Требуется client_id"
-            }), 400
+            }, 400)
 
         processor = DocumentProcessor(client_id=client_id)
         file_chunks = processor.faiss_manager.get_chunks_by_source(filename)
 
         if not file_chunks:
-            return jsonify({
+            return _json({
                 "status": "ok",
                 "client_id": client_id,
                 "filename": filename,
@@ -1169,7 +1213,7 @@ def get_file_materials(filename):
         # Сортируем по индексу чанка
         formatted_chunks.sort(key=lambda x: x['chunk_index'])
 
-        return jsonify({
+        return _json({
             "status": "ok",
             "client_id": client_id,
             "filename": filename,
@@ -1179,10 +1223,10 @@ def get_file_materials(filename):
         })
 
     except Exception as e:
-        return jsonify({
+        return _json({
             "status": "error",
             "error": str(e)
-        }), 500
+        }, 500)
 
 
 @bp.route("/faiss/materials/categories", methods=["GET"])
@@ -1192,10 +1236,10 @@ def get_categories():
         client_id = request.args.get('client_id')
 
         if not client_id:
-            return jsonify({
+            return _json({
                 "status": "error",
                 "error": "Требуется client_id"
-            }), 400
+            }, 400)
 
         processor = DocumentProcessor(client_id=client_id)
         all_chunks = processor.faiss_manager.get_all_chunks()
@@ -1235,7 +1279,7 @@ def get_categories():
         # Сортируем по количеству файлов
         formatted_categories.sort(key=lambda x: x['files_count'], reverse=True)
 
-        return jsonify({
+        return _json({
             "status": "ok",
             "client_id": client_id,
             "total_categories": len(formatted_categories),
@@ -1243,32 +1287,34 @@ def get_categories():
         })
 
     except Exception as e:
-        return jsonify({
+        return _json({
             "status": "error",
             "error": str(e)
-        }), 500
+        }, 500)
 
 
 @bp.route("/faiss/materials/delete", methods=["DELETE"])
 def delete_material():
     """Удалить материал из индекса"""
     try:
-        data = request.json
+        data, error_response = _load_json()
+        if error_response is not None:
+            return error_response
         client_id = data.get('client_id')
         source_file = data.get('source_file')
         chunk_id = data.get('chunk_id')  # Опционально - удалить конкретный чанк
 
         if not client_id:
-            return jsonify({
+            return _json({
                 "status": "error",
                 "error": "Требуется client_id"
-            }), 400
+            }, 400)
 
         if not source_file and not chunk_id:
-            return jsonify({
+            return _json({
                 "status": "error",
                 "error": "Требуется source_file или chunk_id"
-            }), 400
+            }, 400)
 
         processor = DocumentProcessor(client_id=client_id)
 
@@ -1277,36 +1323,36 @@ def delete_material():
             success = processor.faiss_manager.remove_chunks([chunk_id])
             if success:
                 processor.faiss_manager.save_index()
-                return jsonify({
+                return _json({
                     "status": "ok",
                     "message": f"Чанк {chunk_id} удален",
                     "deleted_chunks": 1
                 })
             else:
-                return jsonify({
+                return _json({
                     "status": "error",
                     "error": "Не удалось удалить чанк"
-                }), 500
+                }, 500)
 
         elif source_file:
             # Удаляем весь файл
             success = processor.remove_document(source_file)
             if success:
-                return jsonify({
+                return _json({
                     "status": "ok",
                     "message": f"Файл {source_file} удален из индекса"
                 })
             else:
-                return jsonify({
+                return _json({
                     "status": "error",
                     "error": "Файл не найден или не удалось удалить"
-                }), 404
+                }, 404)
 
     except Exception as e:
-        return jsonify({
+        return _json({
             "status": "error",
             "error": str(e)
-        }), 500
+        }, 500)
 
 
 @bp.route("/faiss/system_info", methods=["GET"])
@@ -1318,7 +1364,7 @@ def system_info():
 
         dependencies = check_dependencies()
 
-        return jsonify({
+        return _json({
             "success": True,
             "system_info": {
                 "text_model": settings.EMBEDDING_MODEL,
@@ -1340,7 +1386,7 @@ def system_info():
         })
 
     except Exception as e:
-        return jsonify({
+        return _json({
             "success": False,
             "error": str(e)
-        }), 500
\ No newline at end of file
+        }, 500)
\ No newline at end of file
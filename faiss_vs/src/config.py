@@ -32,6 +32,13 @@ class Settings(BaseSettings):
     # FAISS settings
     FAISS_INDEX_TYPE: str = "FlatIP"
 
+    # Дисковый кэш embeddings поисковых запросов (второй уровень после кэша в памяти).
+    # Файл на каждый различный вопрос, поэтому по умолчанию выключен; при включении
+    # число файлов ограничено, самые старые удаляются при записи
+    ENABLE_QUERY_EMBEDDING_DISK_CACHE: bool = False
+    QUERY_EMBEDDING_CACHE_DIR: Path = DATA_DIR / "query_embeddings"
+    QUERY_EMBEDDING_CACHE_MAX_FILES: int = 20000
+
     KEEP_DOWNLOADED_FILES: bool = False  # False = удаляем файлы после обработки
     CLEANUP_ON_ERROR: bool = True  # True = удаляем файлы даже при ошибках
     # Document processing
@@ -1,5 +1,6 @@
 import json
 import requests
+from requests.adapters import HTTPAdapter
 import hashlib
 import re
 from pathlib import Path
@@ -16,6 +17,28 @@ import openpyxl
 
 from ..config import settings
 
+# Общий пул соединений: загрузчики всех клиентов переиспользуют TCP/TLS-соединения
+# к одним и тем же хостам. Разделяется только HTTPAdapter (он потокобезопасен),
+# сессия с cookies и заголовками у каждого загрузчика своя
+HTTP_POOL_SIZE = 32
+HTTP_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+_http_adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+
+
+def get_http_session() -> requests.Session:
+    """
+    Возвращает новую HTTP-сессию поверх общего пула соединений
+
+    Сессию не нужно закрывать: close() закрыл бы общий адаптер
+    """
+    session = requests.Session()
+    session.mount("http://", _http_adapter)
+    session.mount("https://", _http_adapter)
+    session.headers.update(HTTP_HEADERS)
+    return session
+
 
 @dataclass
 class DocumentMetadata:
@@ -32,10 +55,7 @@ class DocumentMetadata:
 class DocumentLoader:
     def __init__(self, client_id: str = None):  # ✅ ДОБАВЛЕН client_id
         self.client_id = client_id
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+        self.session = get_http_session()
 
     def load_from_json(self, json_file_path: str) -> List[Dict]:
         """Загружает список документов из JSON файла"""
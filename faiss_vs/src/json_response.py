@@ -0,0 +1,33 @@
+"""
+Сериализация JSON-ответов, общая для blueprint'ов faiss_vs и lk_assistant
+"""
+
+import json
+
+from flask import current_app
+
+# orjson кодирует и разбирает JSON в несколько раз быстрее стандартного json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def dumps(data) -> bytes:
+    """JSON в байтах; numpy-массивы, ключи не-строки и прочие типы (через str) поддерживаются"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(
+            data, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
+    return json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+
+
+def loads(body):
+    """Разбор JSON; при ошибке — ValueError"""
+    return orjson.loads(body) if ORJSON_AVAILABLE else json.loads(body)
+
+
+def json_response(data, status: int = 200):
+    """JSON-ответ (замена jsonify)"""
+    return current_app.response_class(dumps(data), status=status, mimetype="application/json")
@@ -2,9 +2,13 @@ import faiss
 import numpy as np
 import pickle
 import json
+import hashlib
+import os
 from pathlib import Path
 from typing import List, Dict, Any, Optional, Tuple
 import logging
+import threading
+from collections import OrderedDict
 from datetime import datetime
 
 from sentence_transformers import SentenceTransformer
@@ -14,6 +18,19 @@ from ..config import settings
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# LRU-кэш embeddings поисковых запросов: (модель, нормализация, текст) -> вектор.
+# Общий для всех менеджеров: embedding запроса не зависит от клиента
+QUERY_EMBEDDING_CACHE_SIZE = 4096
+MAX_CACHED_QUERY_LENGTH = 512
+_query_embedding_cache: "OrderedDict[Tuple[str, bool, str], np.ndarray]" = OrderedDict()
+_query_embedding_lock = threading.Lock()
+
+# Плоский индекс с таким числом векторов при сохранении перестраивается в IVF:
+# поиск просматривает IVF_NPROBE кластеров из IVF_NLIST вместо всех векторов
+IVF_MIN_VECTORS = 10_000
+IVF_NLIST = 100
+IVF_NPROBE = 30
+
 
 class FAISSManager:
     """Менеджер для работы с FAISS векторной базой данных с поддержкой мультимодальности"""
@@ -139,6 +156,142 @@ class FAISSManager:
 
         return embeddings.astype(np.float32)
 
+    def has_cached_query_embedding(self, query: str) -> bool:
+        """Проверяет, есть ли embedding запроса в кэше в памяти"""
+        key = (self.model_name, self.index_type == "FlatIP", query)
+        with _query_embedding_lock:
+            return key in _query_embedding_cache
+
+    def create_query_embedding(self, query: str) -> np.ndarray:
+        """Создает embedding поискового запроса, повторные запросы берутся из кэша"""
+        if len(query) > MAX_CACHED_QUERY_LENGTH:
+            return self.create_embeddings([query])
+
+        key = (self.model_name, self.index_type == "FlatIP", query)
+        with _query_embedding_lock:
+            cached = _query_embedding_cache.get(key)
+            if cached is not None:
+                _query_embedding_cache.move_to_end(key)
+                return cached
+
+        query_embedding = self._load_query_embedding(query)
+        if query_embedding is None:
+            query_embedding = self.create_embeddings([query])
+            self._save_query_embedding(query, query_embedding)
+
+        with _query_embedding_lock:
+            _query_embedding_cache[key] = query_embedding
+            if len(_query_embedding_cache) > QUERY_EMBEDDING_CACHE_SIZE:
+                _query_embedding_cache.popitem(last=False)
+
+        return query_embedding
+
+    def create_query_embeddings(self, queries: List[str]) -> np.ndarray:
+        """
+        Создает embeddings нескольких запросов одним вызовом модели
+
+        Уже закэшированные запросы не пересчитываются, новые попадают в кэш
+        create_query_embedding. Возвращает матрицу в порядке queries
+        """
+        normalize = self.index_type == "FlatIP"
+        keys = [(self.model_name, normalize, query) for query in queries]
+
+        embeddings: List[Optional[np.ndarray]] = [None] * len(queries)
+        missing = []
+        with _query_embedding_lock:
+            for i, key in enumerate(keys):
+                cached = _query_embedding_cache.get(key) if len(key[2]) <= MAX_CACHED_QUERY_LENGTH else None
+                if cached is not None:
+                    _query_embedding_cache.move_to_end(key)
+                    embeddings[i] = cached
+                else:
+                    missing.append(i)
+
+        # Второй уровень — кэш на диске, модель запускаем только для оставшихся
+        to_compute = []
+        for i in missing:
+            embeddings[i] = self._load_query_embedding(queries[i])
+            if embeddings[i] is None:
+                to_compute.append(i)
+
+        if to_compute:
+            computed = self.create_embeddings([queries[i] for i in to_compute])
+            for row, i in enumerate(to_compute):
+                embeddings[i] = computed[row:row + 1]
+                self._save_query_embedding(queries[i], embeddings[i])
+
+        if missing:
+            with _query_embedding_lock:
+                for i in missing:
+                    if len(queries[i]) <= MAX_CACHED_QUERY_LENGTH:
+                        _query_embedding_cache[keys[i]] = embeddings[i]
+                while len(_query_embedding_cache) > QUERY_EMBEDDING_CACHE_SIZE:
+                    _query_embedding_cache.popitem(last=False)
+
+        return np.vstack(embeddings)
+
+    def _query_embedding_path(self, query: str) -> Path:
+        """Путь к embedding запроса в дисковом кэше: sha256 от модели, нормализации и текста"""
+        digest = hashlib.sha256(
+            f"{self.model_name}\0{self.index_type == 'FlatIP'}\0{query}".encode("utf-8")
+        ).hexdigest()
+        return settings.QUERY_EMBEDDING_CACHE_DIR / digest[:2] / f"{digest}.npy"
+
+    def _load_query_embedding(self, query: str) -> Optional[np.ndarray]:
+        """Читает embedding запроса с диска (None — нет в кэше или кэш отключен)"""
+        if not settings.ENABLE_QUERY_EMBEDDING_DISK_CACHE or len(query) > MAX_CACHED_QUERY_LENGTH:
+            return None
+
+        try:
+            return np.load(self._query_embedding_path(query))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать embedding запроса из кэша: {e}")
+            return None
+
+    def _save_query_embedding(self, query: str, query_embedding: np.ndarray):
+        """Сохраняет embedding запроса на диск (через временный файл, чтобы не оставить битый)"""
+        if not settings.ENABLE_QUERY_EMBEDDING_DISK_CACHE or len(query) > MAX_CACHED_QUERY_LENGTH:
+            return
+
+        path = self._query_embedding_path(query)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                np.save(f, query_embedding)
+            os.replace(tmp_path, path)
+            self._prune_query_embedding_shard(path.parent)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить embedding запроса в кэш: {e}")
+
+    @staticmethod
+    def _prune_query_embedding_shard(shard_dir: Path):
+        """
+        Удаляет самые старые файлы подкаталога кэша сверх его доли лимита
+
+        Кэш разбит на 256 подкаталогов по первым символам хэша, поэтому при записи
+        просматривается только один небольшой подкаталог
+        """
+        limit = max(1, settings.QUERY_EMBEDDING_CACHE_MAX_FILES // 256)
+        files = list(shard_dir.glob("*.npy"))
+        if len(files) <= limit:
+            return
+
+        def mtime(file_path: Path) -> float:
+            try:
+                return file_path.stat().st_mtime
+            except FileNotFoundError:
+                return 0.0
+
+        files.sort(key=mtime)
+        for file_path in files[:len(files) - limit]:
+            try:
+                file_path.unlink()
+            except FileNotFoundError:
+                pass
+
     def add_chunks(self, chunks: List[TextChunk]) -> List[int]:
         """Добавляет чанки в индекс"""
         if self.index is None:
@@ -444,7 +597,7 @@ class FAISSManager:
             return []
 
         # Создаем embedding для запроса
-        query_embedding = self.create_embeddings([query])
+        query_embedding = self.create_query_embedding(query)
 
 
         # Выполняем поиск
@@ -478,7 +631,7 @@ class FAISSManager:
         if not self.enable_visual_search or self.text_index is None or self.text_index.ntotal == 0:
             return []
 
-        query_embedding = self.create_embeddings([query])
+        query_embedding = self.create_query_embedding(query)
         scores, indices = self.text_index.search(query_embedding, k)
 
         return self._format_search_results(scores[0], indices[0], "text", score_threshold)
@@ -600,6 +753,38 @@ class FAISSManager:
 
     # ✅ ОБНОВЛЕННЫЕ методы сохранения/загрузки
 
+    @staticmethod
+    def _maybe_convert_to_ivf(index):
+        """
+        Перестраивает большой плоский индекс в IndexIVFFlat с той же метрикой
+
+        Порядок векторов сохраняется, поэтому id в маппингах остаются верными.
+        Визуальный индекс не перестраивается: из него читаются векторы через reconstruct
+        """
+        if not isinstance(index, (faiss.IndexFlatIP, faiss.IndexFlatL2)) or index.ntotal < IVF_MIN_VECTORS:
+            return index
+
+        vectors = index.reconstruct_n(0, index.ntotal)
+        if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            quantizer = faiss.IndexFlatIP(index.d)
+        else:
+            quantizer = faiss.IndexFlatL2(index.d)
+
+        ivf_index = faiss.IndexIVFFlat(quantizer, index.d, IVF_NLIST, index.metric_type)
+        ivf_index.train(vectors)
+        ivf_index.add(vectors)
+        ivf_index.nprobe = IVF_NPROBE
+
+        logger.info(f"✅ Индекс перестроен в IVF: {index.ntotal} векторов, nlist={IVF_NLIST}, nprobe={IVF_NPROBE}")
+        return ivf_index
+
+    @staticmethod
+    def _configure_loaded_index(index):
+        """Настраивает параметры поиска загруженного индекса"""
+        if isinstance(index, faiss.IndexIVF):
+            index.nprobe = IVF_NPROBE
+        return index
+
     def save_index(self):
         """Сохраняет индекс и метаданные на диск"""
         logger.info("Сохраняем FAISS индекс(ы) и метаданные")
@@ -607,6 +792,7 @@ class FAISSManager:
         if self.enable_visual_search:
             # Сохраняем мультимодальные индексы
             if self.text_index is not None:
+                self.text_index = self._maybe_convert_to_ivf(self.text_index)
                 faiss.write_index(self.text_index, str(self.text_index_path))
                 logger.info(f"✅ Текстовый индекс сохранен: {self.text_index.ntotal} векторов")
 
@@ -616,6 +802,7 @@ class FAISSManager:
         else:
             # Сохраняем единый индекс
             if self.index is not None:
+                self.index = self._maybe_convert_to_ivf(self.index)
                 faiss.write_index(self.index, str(self.index_path))
                 logger.info(f"✅ Индекс сохранен: {self.index.ntotal} векторов")
 
@@ -693,7 +880,7 @@ class FAISSManager:
             if self.enable_visual_search:
                 # Загружаем мультимодальные индексы
                 if self.text_index_path.exists():
-                    self.text_index = faiss.read_index(str(self.text_index_path))
+                    self.text_index = self._configure_loaded_index(faiss.read_index(str(self.text_index_path)))
                     logger.info(f"✅ Текстовый индекс загружен: {self.text_index.ntotal} векторов")
 
                 if self.visual_index_path.exists():
@@ -702,7 +889,7 @@ class FAISSManager:
             else:
                 # Загружаем единый индекс
                 if self.index_path.exists():
-                    self.index = faiss.read_index(str(self.index_path))
+                    self.index = self._configure_loaded_index(faiss.read_index(str(self.index_path)))
                     logger.info(f"✅ Индекс загружен: {self.index.ntotal} векторов")
 
             # Загружаем метаданные
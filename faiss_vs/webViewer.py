@@ -1,10 +1,16 @@
 from fastapi import FastAPI, HTTPException, Query
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import HTMLResponse
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 import uvicorn
+import os
 import sys
 from pathlib import Path
 import json
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from itertools import islice
+from html import escape
 from urllib.parse import quote
 
 # Добавляем src в путь
@@ -13,27 +19,70 @@ sys.path.append(str(Path(__file__).parent / "src"))
 from src.vectorstore.faiss_manager import FAISSManager
 
 app = FastAPI(title="FAISS Chunks Viewer", description="Просмотр чанков из FAISS индекса")
+# HTML страниц с чанками сильно повторяется и хорошо сжимается
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
-# Глобальные переменные
-faiss_manager = None
-current_client_id = None
 
+@dataclass
+class ClientIndex:
+    """Загруженный индекс клиента и предвычисленные фильтры по метаданным"""
+    manager: FAISSManager
+    by_source: Dict[str, List[Dict[str, Any]]]  # source_file -> чанки
+    by_category: Dict[str, List[Dict[str, Any]]]  # category.lower() -> чанки
 
-def initialize_faiss_manager(client_id: str):
-    """Инициализирует FAISS manager для конкретного клиента"""
-    global faiss_manager, current_client_id
 
-    if faiss_manager is None or current_client_id != client_id:
-        faiss_manager = FAISSManager(client_id=client_id)
-        current_client_id = client_id
-        loaded = faiss_manager.load_index()
-        if not loaded:
-            print(f"⚠️ Индекс для клиента {client_id} не найден или не загружен")
-            return False
-        else:
-            print(f"✅ Индекс для клиента {client_id} загружен")
-            return True
-    return True
+# Кэш загруженных индексов: client_id -> ClientIndex (LRU)
+MAX_CACHED_MANAGERS = 8
+_managers: "OrderedDict[str, ClientIndex]" = OrderedDict()
+
+
+def _build_client_index(manager: FAISSManager) -> ClientIndex:
+    """
+    Один проход по чанкам: группирует их по файлу (точное имя, как get_chunks_by_source)
+    и по категории (ключ в нижнем регистре)
+    """
+    by_source = defaultdict(list)
+    by_category = defaultdict(list)
+
+    for chunk in manager.get_all_chunks():
+        metadata = chunk.get('metadata') or {}
+        by_source[chunk.get('source_file')].append(chunk)
+        by_category[str(metadata.get('category') or '').lower()].append(chunk)
+
+    return ClientIndex(manager=manager, by_source=dict(by_source), by_category=dict(by_category))
+
+
+def get_client_index(client_id: str) -> Optional[ClientIndex]:
+    """Возвращает индекс клиента, загружая его с диска только при промахе кэша"""
+    client_index = _managers.get(client_id)
+    if client_index is not None:
+        _managers.move_to_end(client_id)
+        return client_index
+
+    manager = FAISSManager(client_id=client_id)
+    if not manager.load_index():
+        print(f"⚠️ Индекс для клиента {client_id} не найден или не загружен")
+        return None
+
+    print(f"✅ Индекс для клиента {client_id} загружен")
+    client_index = _build_client_index(manager)
+    _managers[client_id] = client_index
+    if len(_managers) > MAX_CACHED_MANAGERS:
+        _managers.popitem(last=False)
+    return client_index
+
+
+# Важные поля метаданных (показываются первыми) и их русские названия
+IMPORTANT_METADATA_FIELDS = {
+    'source_url': 'Ссылка',
+    'category': 'Категория',
+    'parent': 'Родитель',
+    'date': 'Дата',
+    'guiddoc': 'GUID',
+    'object_id': 'ID объекта',
+    'title': 'Заголовок',
+    'description': 'Описание'
+}
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -77,6 +126,7 @@ async def root():
             <ul>
                 <li><strong>/chunks?client_id=XXX</strong> - просмотр всех чанков клиента</li>
                 <li><strong>/chunks?client_id=XXX&source_file=filename.pdf</strong> - чанки конкретного файла</li>
+                <li><strong>/chunks?client_id=XXX&category=название</strong> - чанки категории</li>
                 <li><strong>/stats?client_id=XXX</strong> - статистика индекса клиента</li>
                 <li><strong>/search?client_id=XXX&query=текст</strong> - поиск по чанкам</li>
             </ul>
@@ -91,24 +141,35 @@ async def root():
 async def view_chunks(
         client_id: str = Query(..., description="ID клиента"),
         source_file: Optional[str] = Query(None, description="Имя файла для фильтрации"),
+        category: Optional[str] = Query(None, description="Категория для фильтрации"),
         limit: int = Query(50, description="Максимум чанков для отображения")
 ):
     """Веб-страница с просмотром чанков"""
 
-    # Инициализируем FAISS manager
-    if not initialize_faiss_manager(client_id):
+    # Получаем индекс клиента
+    client_index = get_client_index(client_id)
+    if client_index is None:
         raise HTTPException(status_code=404, detail=f"Индекс для клиента {client_id} не найден")
 
-    # Получаем чанки
+    # Получаем чанки через предвычисленные фильтры
+    title_suffix = ""
     if source_file:
-        chunks = faiss_manager.get_chunks_by_source(source_file)
-        title_suffix = f" для файла '{source_file}'"
+        chunks = client_index.by_source.get(source_file, [])
+        title_suffix += f" для файла '{escape(source_file, quote=True)}'"
+        if category:
+            category_key = category.lower()
+            chunks = [chunk for chunk in chunks
+                      if str((chunk.get('metadata') or {}).get('category') or '').lower() == category_key]
+    elif category:
+        chunks = client_index.by_category.get(category.lower(), [])
     else:
-        chunks = faiss_manager.get_all_chunks()
-        title_suffix = ""
+        chunks = client_index.manager.get_all_chunks()
 
-    # Ограничиваем количество для отображения
-    chunks_limited = chunks[:limit] if len(chunks) > limit else chunks
+    if category:
+        title_suffix += f" в категории '{escape(category, quote=True)}'"
+
+    # Ограничиваем количество для отображения (без копирования списка)
+    shown_count = min(len(chunks), limit)
 
     html_content = f"""
     <!DOCTYPE html>
@@ -295,7 +356,7 @@ async def view_chunks(
                         <div class="stat-label">Всего чанков</div>
                     </div>
                     <div class="stat-card">
-                        <div class="stat-number">{len(chunks_limited)}</div>
+                        <div class="stat-number">{shown_count}</div>
                         <div class="stat-label">Показано</div>
                     </div>
                     <div class="stat-card">
@@ -306,7 +367,8 @@ async def view_chunks(
 
                 <form class="filter-form" method="GET">
                     <input type="hidden" name="client_id" value="{client_id}">
-                    <input type="text" name="source_file" placeholder="Фильтр по файлу" value="{source_file or ''}">
+                    <input type="text" name="source_file" placeholder="Фильтр по файлу" value="{escape(source_file or '', quote=True)}">
+                    <input type="text" name="category" placeholder="Фильтр по категории" value="{escape(category or '', quote=True)}">
                     <select name="limit">
                         <option value="25" {"selected" if limit == 25 else ""}>25 чанков</option>
                         <option value="50" {"selected" if limit == 50 else ""}>50 чанков</option>
@@ -334,7 +396,7 @@ async def view_chunks(
     """
 
     # Добавляем строки таблицы
-    for chunk in chunks_limited:
+    for chunk in islice(chunks, limit):
         # Превью текста
         text = chunk.get('text', '')
         preview_text = (text[:200] + "...") if len(text) > 200 else text
@@ -345,53 +407,43 @@ async def view_chunks(
         metadata_html = ""
 
         if metadata:
-            # Важные поля показываем первыми
-            important_fields = ['source_url', 'category', 'parent', 'date', 'guiddoc', 'object_id', 'title',
-                                'description']
-
             # Сначала важные поля
-            for field in important_fields:
-                if field in metadata:
-                    value = metadata[field]
-                    if value:
-                        # Русские названия
-                        field_names = {
-                            'source_url': 'Ссылка',
-                            'category': 'Категория',
-                            'parent': 'Родитель',
-                            'date': 'Дата',
-                            'guiddoc': 'GUID',
-                            'object_id': 'ID объекта',
-                            'title': 'Заголовок',
-                            'description': 'Описание'
-                        }
-
-                        field_name = field_names.get(field, field)
-
-                        # Специальное форматирование для ссылок
-                        if field == 'source_url' and str(value).startswith('http'):
-                            display_value = f'<a href="{value}" target="_blank" class="metadata-url">{str(value)[:50]}...</a>'
-                        else:
-                            display_value = str(value)[:100] + ('...' if len(str(value)) > 100 else '')
-
-                        metadata_html += f'''
-                        <div class="metadata-item">
-                            <span class="metadata-key">{field_name}:</span>
-                            <div class="metadata-value">{display_value}</div>
-                        </div>
-                        '''
-
-            # Затем остальные поля
+            for field, field_name in IMPORTANT_METADATA_FIELDS.items():
+                value = metadata.get(field)
+                if not value:
+                    continue
+
+                text_value = value if isinstance(value, str) else str(value)
+
+                # Специальное форматирование для ссылок
+                if field == 'source_url' and text_value.startswith('http'):
+                    display_value = f'<a href="{text_value}" target="_blank" class="metadata-url">{text_value[:50]}...</a>'
+                else:
+                    display_value = (text_value[:100] + '...') if len(text_value) > 100 else text_value
+
+                metadata_html += f'''
+                <div class="metadata-item">
+                    <span class="metadata-key">{field_name}:</span>
+                    <div class="metadata-value">{display_value}</div>
+                </div>
+                '''
+
+            # Затем остальные поля (пустые значения пропускаем до приведения к строке)
             for key, value in metadata.items():
-                if key not in important_fields:
-                    if value and str(value).strip():
-                        display_value = str(value)[:80] + ('...' if len(str(value)) > 80 else '')
-                        metadata_html += f'''
-                        <div class="metadata-item">
-                            <span class="metadata-key">{key}:</span>
-                            <div class="metadata-value">{display_value}</div>
-                        </div>
-                        '''
+                if key in IMPORTANT_METADATA_FIELDS or not value:
+                    continue
+
+                text_value = value if isinstance(value, str) else str(value)
+                if not text_value.strip():
+                    continue
+
+                display_value = (text_value[:80] + '...') if len(text_value) > 80 else text_value
+                metadata_html += f'''
+                <div class="metadata-item">
+                    <span class="metadata-key">{key}:</span>
+                    <div class="metadata-value">{display_value}</div>
+                </div>
+                '''
         else:
             metadata_html = '<div class="empty-value">Нет метаданных</div>'
 
@@ -416,7 +468,7 @@ async def view_chunks(
     """
 
     if len(chunks) > limit:
-        html_content += f"Показано {len(chunks_limited)} из {len(chunks)} чанков. Увеличьте лимит для просмотра всех."
+        html_content += f"Показано {shown_count} из {len(chunks)} чанков. Увеличьте лимит для просмотра всех."
     else:
         html_content += f"Показаны все {len(chunks)} чанков."
 
@@ -433,8 +485,10 @@ async def view_chunks(
 @app.get("/stats")
 async def index_stats(client_id: str = Query(..., description="ID клиента")):
     """Возвращает статистику индекса в JSON"""
-    if not initialize_faiss_manager(client_id):
+    client_index = get_client_index(client_id)
+    if client_index is None:
         raise HTTPException(status_code=404, detail=f"Индекс для клиента {client_id} не найден")
+    faiss_manager = client_index.manager
 
     stats = faiss_manager.get_index_stats()
 
@@ -469,8 +523,10 @@ async def search_chunks(
         k: int = Query(10, description="Количество результатов")
 ):
     """Поиск по чанкам"""
-    if not initialize_faiss_manager(client_id):
+    client_index = get_client_index(client_id)
+    if client_index is None:
         raise HTTPException(status_code=404, detail=f"Индекс для клиента {client_id} не найден")
+    faiss_manager = client_index.manager
 
     # Выполняем поиск
     results = faiss_manager.search(query, k=k)
@@ -538,4 +594,14 @@ if __name__ == "__main__":
     print("📊 Статистика: http://localhost:8000/stats?client_id=YOUR_CLIENT_ID")
     print("🔍 Чанки: http://localhost:8000/chunks?client_id=YOUR_CLIENT_ID")
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Один процесс по умолчанию: каждый процесс держит свою копию модели и кэша индексов.
+    # uvloop/httptools (loop/http="auto" выбирает их, если установлены)
+    uvicorn.run(
+        "webViewer:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=int(os.getenv("VIEWER_WORKERS", "1")),
+        loop="auto",
+        http="auto",
+        access_log=False
+    )
\ No newline at end of file
@@ -0,0 +1,20 @@
+"""
+Настройки gunicorn для основного API (подхватываются автоматически при запуске из корня)
+Запуск: gunicorn main:app
+"""
+
+import os
+
+bind = os.getenv("API_BIND", "0.0.0.0:8000")
+
+# Один процесс с пулом потоков. В памяти процесса живут кэш ассистентов (у каждого ассистента
+# свой AnswerCache готовых ответов по точному тексту вопроса), кэш HTTP-ответов и их версии:
+# при нескольких процессах /assistant/reload и /assistant/clear_cache действовали бы только на
+# принявший запрос процесс, а каждый процесс загружал бы свою копию модели и индексов.
+# Масштабирование — через threads; WEB_CONCURRENCY > 1 допустимо только без этих операций
+worker_class = "gthread"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+threads = int(os.getenv("API_THREADS", "32"))
+
+# Heartbeat воркеров в памяти, а не на диске
+worker_tmp_dir = "/dev/shm"
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Кэш ответов ассистента
+Файл: lk_assistant/answer_cache.py
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+def normalize_question(question: str) -> str:
+    """Приводит вопрос к ключу кэша: регистр и пробелы не влияют на совпадение"""
+    return " ".join(question.casefold().split())
+
+
+class AnswerCache:
+    """
+    LRU-кэш готовых ответов по точному (нормализованному) тексту вопроса
+    со временем жизни записей ttl секунд
+
+    Близость embeddings не используется: у e5 косинусная близость разных вопросов
+    высока (например, вопросы по шаблону, отличающиеся только названием категории),
+    и такой кэш отдавал бы чужой ответ
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        # ключ -> (expires_at, значение)
+        self._items: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Возвращает сохраненное значение или None (нет записи или она устарела)"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[0] <= time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item[1]
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Есть ли живая запись (порядок вытеснения не меняется)"""
+        item = self._items.get(key)
+        return item is not None and item[0] > time.monotonic()
+
+    def put(self, key: Hashable, value: Any):
+        """Сохраняет значение, вытесняя давно не использованное при переполнении"""
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, value)
+            self._items.move_to_end(key)
+            if len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        """Очищает кэш"""
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
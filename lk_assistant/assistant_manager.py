@@ -4,27 +4,85 @@
 Файл: lk_assistant/assistant_manager.py
 """
 
+import heapq
 import logging
+import sys
 import threading
-from typing import Dict, Optional, Any
-from datetime import datetime, timedelta
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Any
+from datetime import datetime
 from .lk_assistant import LKAssistant
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+class _CacheEntry:
+    """Запись кэша ассистентов"""
+
+    __slots__ = ('assistant', 'created_at', 'created_at_iso', 'last_accessed', 'expires_at', 'scheduled_expiry',
+                 'access_count', 'referenced', '__weakref__')
+
+    def __init__(self, assistant: LKAssistant, expires_at: float):
+        self.assistant = assistant
+        self.created_at = datetime.now()
+        self.created_at_iso = self.created_at.isoformat()  # не меняется, форматируем один раз
+        self.last_accessed = time.time()  # wall clock, только для отображения
+        self.expires_at = expires_at  # time.monotonic()
+        self.scheduled_expiry = expires_at  # срок, под которым запись лежит в куче истечений
+        self.access_count = 1
+        self.referenced = False  # бит обращения для вытеснения по алгоритму CLOCK
+
+
 class AssistantManager:
     """
     Менеджер для управления несколькими ассистентами
     Обеспечивает кэширование, автоочистку и мониторинг
     """
 
+    # Сколько элементов кучи истечений фоновая очистка разбирает за один захват блокировки
+    CLEANUP_BATCH_SIZE = 16
+
     def __init__(self, cache_ttl_minutes: int = 60, max_assistants: int = 100):
         self.cache_ttl_minutes = cache_ttl_minutes
         self.max_assistants = max_assistants
-        self.assistants_cache: Dict[str, Dict[str, Any]] = {}
-        self.lock = threading.Lock()
+        self._ttl_seconds = cache_ttl_minutes * 60
+        # Очередь вытеснения CLOCK (second chance): голова — следующий кандидат
+        self.assistants_cache: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self.lock = threading.RLock()
+
+        # Мин-куча (expires_at, client_id): продление записи кучу не трогает, такие
+        # элементы перепланируются при извлечении в _cleanup_expired
+        self._expiry_heap = []
+
+        # Последняя запись, выданная потоку: (client_id, слабая ссылка на запись, поколение).
+        # Поколение увеличивается при любом удалении из кэша, что делает слоты всех потоков
+        # недействительными; слабая ссылка не держит в памяти уже вытесненного ассистента.
+        # Слот окупается, пока запросы обслуживают постоянные потоки (синхронные view под
+        # gthread); у async view под Flask поток на каждый запрос свой и слот не переиспользуется
+        self._tls = threading.local()
+        self._generation = 0
+
+        # Создаваемые сейчас ассистенты: client_id -> Future. Ассистента клиента создает
+        # один поток, остальные запросы этого клиента ждут его результат; создание идет
+        # вне общей блокировки, поэтому другие клиенты и попадания в кэш не ждут
+        self._inflight: Dict[str, Future] = {}
+
+        # Счетчики эффективности кэша. Попадания считаются без блокировки и могут
+        # немного занижаться при гонках — для мониторинга этого достаточно
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+        # Фоновая очистка устаревших записей, чтобы не делать ее на пути запроса
+        self._stop_cleanup = threading.Event()
+        self._cleanup_thread = threading.Thread(
+            target=self._cleanup_loop, name="AssistantManagerCleanup", daemon=True
+        )
+        self._cleanup_thread.start()
 
         logger.info(f"AssistantManager инициализирован: TTL={cache_ttl_minutes}мин, MAX={max_assistants}")
 
@@ -39,76 +97,216 @@ class AssistantManager:
         Returns:
             LKAssistant: Экземпляр ассистента
         """
+        if not force_reload:
+            assistant = self.get_cached_assistant(client_id)
+            if assistant is not None:
+                return assistant
+
+        return self._get_assistant_slow(client_id, force_reload)
+
+    def get_cached_assistant(self, client_id: str) -> Optional[LKAssistant]:
+        """
+        Возвращает живого ассистента из кэша, не создавая его (продлевает срок жизни записи)
+
+        Быстрый путь get_assistant: не берет общую блокировку и не обращается к диску,
+        поэтому попадания в кэш из параллельных запросов не ждут друг друга
+
+        Returns:
+            LKAssistant или None при промахе
+        """
+        # Поток обычно обслуживает одного и того же клиента подряд — сначала свой слот
+        # Поколение читаем до поиска в кэше: удаление после него сделает слот недействительным
+        generation = self._generation
+        last = getattr(self._tls, 'last', None)
+        cache_entry = None
+        if last is not None and last[0] == client_id and last[2] == generation:
+            cache_entry = last[1]()
+        if cache_entry is None:
+            cache_entry = self.assistants_cache.get(client_id)
+            last = self._tls.last = None
+
+        if cache_entry is not None:
+            now = time.monotonic()
+            if cache_entry.expires_at > now:
+                cache_entry.expires_at = now + self._ttl_seconds
+                cache_entry.last_accessed = time.time()
+                cache_entry.access_count += 1
+                cache_entry.referenced = True
+                if last is None:
+                    self._tls.last = (client_id, weakref.ref(cache_entry), generation)
+                self._hits += 1
+                return cache_entry.assistant
+
+        return None
+
+    def _get_assistant_slow(self, client_id: str, force_reload: bool) -> LKAssistant:
+        """Медленный путь get_assistant: промах, устаревшая запись или принудительная перезагрузка"""
+        # Интернированная строка: повторные поиски в кэше сравнивают ключи по указателю
+        client_id = sys.intern(client_id)
+
+        if force_reload:
+            with self.lock:
+                cache_entry = self.assistants_cache.pop(client_id, None)
+                if cache_entry is not None:
+                    self._generation += 1
+                    logger.info(f"Принудительно перезагружаем ассистента для клиента {client_id}")
+            if cache_entry is not None:
+                # Запросы, еще держащие старого ассистента, не должны отдавать ответы по старому индексу
+                cache_entry.assistant.clear_answer_cache()
+
         with self.lock:
-            # Очищаем устаревшие записи
-            self._cleanup_expired()
+            future = self._inflight.get(client_id)
+            if future is None:
+                # Ассистента мог только что создать другой поток;
+                # заодно здесь удаляется устаревшая запись
+                assistant = self._get_cached_assistant(client_id)
+                if assistant is not None:
+                    return assistant
+
+                future = self._inflight[client_id] = Future()
+                is_builder = True
+            else:
+                is_builder = False
+
+        if not is_builder:
+            # Ассистента уже создает другой поток — ждем его (в том числе его ошибку)
+            return future.result()
+
+        # Создаем нового ассистента вне общей блокировки
+        logger.info(f"Создаем нового ассистента для клиента {client_id}")
+        try:
+            assistant = LKAssistant(client_id=client_id)
+        except BaseException as e:
+            with self.lock:
+                del self._inflight[client_id]
+            future.set_exception(e)
+            raise
 
-            # Проверяем лимит
+        with self.lock:
+            # Проверяем лимит: сначала освобождаем место от устаревших записей
+            if len(self.assistants_cache) >= self.max_assistants:
+                self._cleanup_expired()
             if len(self.assistants_cache) >= self.max_assistants:
                 self._cleanup_oldest()
 
-            # Принудительная перезагрузка
-            if force_reload and client_id in self.assistants_cache:
-                logger.info(f"Принудительно перезагружаем ассистента для клиента {client_id}")
-                del self.assistants_cache[client_id]
+            # Добавляем в кэш
+            self._misses += 1
+            expires_at = time.monotonic() + self._ttl_seconds
+            self.assistants_cache[client_id] = _CacheEntry(assistant, expires_at=expires_at)
+            heapq.heappush(self._expiry_heap, (expires_at, client_id))
+            del self._inflight[client_id]
 
-            # Проверяем кэш
-            if client_id in self.assistants_cache:
-                cache_entry = self.assistants_cache[client_id]
-
-                # Проверяем TTL
-                if self._is_cache_valid(cache_entry):
-                    cache_entry['last_accessed'] = datetime.now()
-                    cache_entry['access_count'] += 1
-                    logger.debug(f"Возвращаем ассистента из кэша для клиента {client_id}")
-                    return cache_entry['assistant']
-                else:
-                    # Удаляем устаревшую запись
-                    del self.assistants_cache[client_id]
-
-            # Создаем нового ассистента
-            logger.info(f"Создаем нового ассистента для клиента {client_id}")
-            assistant = LKAssistant(client_id=client_id)
+        future.set_result(assistant)
+        return assistant
 
-            # Добавляем в кэш
-            self.assistants_cache[client_id] = {
-                'assistant': assistant,
-                'created_at': datetime.now(),
-                'last_accessed': datetime.now(),
-                'access_count': 1
-            }
+    def _get_cached_assistant(self, client_id: str) -> Optional[LKAssistant]:
+        """
+        Возвращает ассистента из кэша или None, если записи нет или она устарела
 
-            return assistant
+        Попадание в кэш обслуживается без блокировки: чтение dict атомарно под GIL,
+        а поля найденной записи обновляются на месте
+        """
+        cache_entry = self.assistants_cache.get(client_id)
+        if cache_entry is None:
+            return None
+
+        # Проверяем TTL
+        if self._is_cache_valid(cache_entry):
+            cache_entry.last_accessed = time.time()
+            cache_entry.expires_at = time.monotonic() + self._ttl_seconds
+            cache_entry.access_count += 1
+            cache_entry.referenced = True
+            logger.debug(f"Возвращаем ассистента из кэша для клиента {client_id}")
+            return cache_entry.assistant
+
+        # Удаляем устаревшую запись, если ее еще не заменили
+        with self.lock:
+            if self.assistants_cache.get(client_id) is cache_entry:
+                del self.assistants_cache[client_id]
+                self._generation += 1
 
-    def _is_cache_valid(self, cache_entry: Dict[str, Any]) -> bool:
+        return None
+
+    def _is_cache_valid(self, cache_entry: _CacheEntry) -> bool:
         """Проверяет валидность записи в кэше"""
-        expiry_time = cache_entry['last_accessed'] + timedelta(minutes=self.cache_ttl_minutes)
-        return datetime.now() < expiry_time
+        return cache_entry.expires_at > time.monotonic()
+
+    def _cleanup_loop(self):
+        """Фоновый поток: раз в четверть TTL удаляет устаревшие записи небольшими порциями"""
+        while not self._stop_cleanup.wait(max(self._ttl_seconds / 4, 1)):
+            try:
+                while not self._stop_cleanup.is_set():
+                    with self.lock:
+                        if not self._cleanup_expired(max_items=self.CLEANUP_BATCH_SIZE):
+                            break
+            except Exception as e:
+                logger.error(f"Ошибка фоновой очистки кэша ассистентов: {e}")
+
+    def stop_background_cleanup(self):
+        """Останавливает фоновый поток очистки"""
+        self._stop_cleanup.set()
+        self._cleanup_thread.join()
+
+    def _cleanup_expired(self, max_items: Optional[int] = None) -> bool:
+        """
+        Удаляет устаревшие записи из кэша
 
-    def _cleanup_expired(self):
-        """Удаляет устаревшие записи из кэша"""
-        expired_clients = []
+        Просматривает только вершину кучи истечений: если ее срок не наступил,
+        работы нет. Вызывается под self.lock
 
-        for client_id, cache_entry in self.assistants_cache.items():
-            if not self._is_cache_valid(cache_entry):
-                expired_clients.append(client_id)
+        Args:
+            max_items: Максимум разбираемых элементов кучи (None — без ограничения)
+
+        Returns:
+            bool: True если работа осталась (порция исчерпана)
+        """
+        heap = self._expiry_heap
+        now = time.monotonic()
+
+        while heap and heap[0][0] <= now:
+            if max_items is not None:
+                if max_items <= 0:
+                    return True
+                max_items -= 1
+
+            scheduled_expiry, client_id = heapq.heappop(heap)
+            cache_entry = self.assistants_cache.get(client_id)
+
+            # Запись удалена или заменена — элемент кучи устарел
+            if cache_entry is None or cache_entry.scheduled_expiry != scheduled_expiry:
+                continue
+
+            # Запись продлена обращением — переносим ее на новый срок
+            if cache_entry.expires_at > now:
+                cache_entry.scheduled_expiry = cache_entry.expires_at
+                heapq.heappush(heap, (cache_entry.expires_at, client_id))
+                continue
 
-        for client_id in expired_clients:
             logger.info(f"Удаляем устаревшего ассистента для клиента {client_id}")
             del self.assistants_cache[client_id]
+            self._generation += 1
+
+        return False
 
     def _cleanup_oldest(self):
-        """Удаляет самую старую запись для освобождения места"""
-        if not self.assistants_cache:
-            return
+        """
+        Удаляет давно не использованную запись для освобождения места
 
-        oldest_client = min(
-            self.assistants_cache.keys(),
-            key=lambda client_id: self.assistants_cache[client_id]['last_accessed']
-        )
+        Алгоритм CLOCK: записи с установленным битом обращения получают второй шанс
+        (бит сбрасывается, запись уходит в конец очереди), удаляется первая запись без бита
+        """
+        while self.assistants_cache:
+            client_id, cache_entry = next(iter(self.assistants_cache.items()))
+            if cache_entry.referenced:
+                cache_entry.referenced = False
+                self.assistants_cache.move_to_end(client_id)
+                continue
 
-        logger.info(f"Удаляем самого старого ассистента для клиента {oldest_client}")
-        del self.assistants_cache[oldest_client]
+            del self.assistants_cache[client_id]
+            self._generation += 1
+            self._evictions += 1
+            logger.info(f"Удаляем самого старого ассистента для клиента {client_id}")
+            return
 
     def remove_assistant(self, client_id: str) -> bool:
         """
@@ -120,15 +318,25 @@ class AssistantManager:
         Returns:
             bool: True если ассистент был удален
         """
+        client_id = sys.intern(client_id)
         with self.lock:
-            if client_id in self.assistants_cache:
-                del self.assistants_cache[client_id]
-                logger.info(f"Ассистент для клиента {client_id} удален из кэша")
-                return True
-            return False
+            if self.assistants_cache.pop(client_id, None) is None:
+                return False
+            self._generation += 1
+
+            logger.info(f"Ассистент для клиента {client_id} удален из кэша")
+            return True
 
     def get_cache_stats(self) -> Dict[str, Any]:
         """Возвращает статистику кэша"""
+        hits, misses = self._hits, self._misses
+        counters = {
+            'hits': hits,
+            'misses': misses,
+            'evictions': self._evictions,
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0.0
+        }
+
         with self.lock:
             total_assistants = len(self.assistants_cache)
 
@@ -137,19 +345,20 @@ class AssistantManager:
                     'total_assistants': 0,
                     'cache_utilization': 0.0,
                     'oldest_entry_age_minutes': 0,
-                    'most_accessed_client': None
+                    'most_accessed_client': None,
+                    **counters
                 }
 
             # Находим самую старую запись
             oldest_time = min(
-                entry['created_at'] for entry in self.assistants_cache.values()
+                entry.created_at for entry in self.assistants_cache.values()
             )
             oldest_age_minutes = (datetime.now() - oldest_time).total_seconds() / 60
 
             # Находим самого активного клиента
             most_accessed_client = max(
                 self.assistants_cache.items(),
-                key=lambda x: x[1]['access_count']
+                key=lambda x: x[1].access_count
             )
 
             return {
@@ -158,10 +367,11 @@ class AssistantManager:
                 'oldest_entry_age_minutes': round(oldest_age_minutes, 2),
                 'most_accessed_client': {
                     'client_id': most_accessed_client[0],
-                    'access_count': most_accessed_client[1]['access_count']
+                    'access_count': most_accessed_client[1].access_count
                 },
                 'max_assistants': self.max_assistants,
-                'cache_ttl_minutes': self.cache_ttl_minutes
+                'cache_ttl_minutes': self.cache_ttl_minutes,
+                **counters
             }
 
     def get_assistant_info(self, client_id: str) -> Optional[Dict[str, Any]]:
@@ -174,35 +384,55 @@ class AssistantManager:
         Returns:
             Dict или None если ассистент не найден в кэше
         """
+        client_id = sys.intern(client_id)
         with self.lock:
-            if client_id not in self.assistants_cache:
-                return None
+            cache_entry = self.assistants_cache.get(client_id)
 
-            cache_entry = self.assistants_cache[client_id]
-            assistant = cache_entry['assistant']
+        if cache_entry is None:
+            return None
 
-            return {
-                'client_id': client_id,
-                'is_ready': assistant.is_ready,
-                'assistant_name': assistant.assistant_name,
-                'conversation_length': len(assistant.conversation_history),
-                'cached_since': cache_entry['created_at'].isoformat(),
-                'last_accessed': cache_entry['last_accessed'].isoformat(),
-                'access_count': cache_entry['access_count'],
-                'cache_valid': self._is_cache_valid(cache_entry)
-            }
+        return self._build_assistant_info(client_id, cache_entry)
+
+    def _build_assistant_info(self, client_id: str, cache_entry: _CacheEntry) -> Dict[str, Any]:
+        """Собирает описание записи кэша (вызывается вне self.lock)"""
+        assistant = cache_entry.assistant
+
+        return {
+            'client_id': client_id,
+            'is_ready': assistant.is_ready,
+            'assistant_name': assistant.assistant_name,
+            'conversation_length': len(assistant.conversation_history),
+            'cached_since': cache_entry.created_at_iso,
+            'last_accessed': datetime.fromtimestamp(cache_entry.last_accessed).isoformat(),
+            'access_count': cache_entry.access_count,
+            'cache_valid': self._is_cache_valid(cache_entry)
+        }
 
     def list_active_assistants(self) -> Dict[str, Dict[str, Any]]:
         """Возвращает список всех активных ассистентов"""
+        # Под блокировкой только снимаем копию, описания собираем после ее освобождения
         with self.lock:
-            active_assistants = {}
+            snapshot = list(self.assistants_cache.items())
 
-            for client_id in self.assistants_cache.keys():
-                info = self.get_assistant_info(client_id)
-                if info:
-                    active_assistants[client_id] = info
+        return {
+            client_id: self._build_assistant_info(client_id, cache_entry)
+            for client_id, cache_entry in snapshot
+        }
 
-            return active_assistants
+    def get_loaded_assistants(self, client_ids: List[str]) -> Dict[str, LKAssistant]:
+        """
+        Загруженные ассистенты нескольких клиентов за один проход по кэшу, без создания новых
+
+        Returns:
+            Dict client_id -> ассистент; незагруженные клиенты в словарь не попадают
+        """
+        with self.lock:
+            cached = {client_id: self.assistants_cache.get(client_id) for client_id in client_ids}
+        return {
+            client_id: cache_entry.assistant
+            for client_id, cache_entry in cached.items()
+            if cache_entry is not None
+        }
 
     def clear_all_cache(self) -> int:
         """
@@ -214,6 +444,8 @@ class AssistantManager:
         with self.lock:
             count = len(self.assistants_cache)
             self.assistants_cache.clear()
+            self._expiry_heap.clear()
+            self._generation += 1
             logger.info(f"Очищен кэш, удалено {count} ассистентов")
             return count
 
@@ -230,6 +462,7 @@ class AssistantManager:
         with self.lock:
             if cache_ttl_minutes is not None:
                 self.cache_ttl_minutes = cache_ttl_minutes
+                self._ttl_seconds = cache_ttl_minutes * 60
                 logger.info(f"Cache TTL обновлен до {cache_ttl_minutes} минут")
 
             if max_assistants is not None:
@@ -241,8 +474,9 @@ class AssistantManager:
                     self._cleanup_oldest()
 
 
-# Глобальный экземпляр менеджера (Singleton)
-_assistant_manager_instance = None
+# Глобальный экземпляр менеджера (Singleton). Создается при импорте модуля:
+# импорт сериализован import lock'ом, поэтому гонки двух потоков за создание нет
+_assistant_manager_instance = AssistantManager()
 
 
 def get_assistant_manager() -> AssistantManager:
@@ -252,9 +486,4 @@ def get_assistant_manager() -> AssistantManager:
     Returns:
         AssistantManager: Экземпляр менеджера
     """
-    global _assistant_manager_instance
-
-    if _assistant_manager_instance is None:
-        _assistant_manager_instance = AssistantManager()
-
     return _assistant_manager_instance
\ No newline at end of file
@@ -6,9 +6,14 @@
 
 import sys
 import json
+import time
+import heapq
 import logging
+from collections import deque
+from itertools import islice
+from operator import itemgetter
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from datetime import datetime
 
 # Добавляем faiss_vs в путь для использования существующих компонентов
@@ -16,21 +21,76 @@ sys.path.append(str(Path(__file__).parent.parent / "faiss_vs"))
 
 from faiss_vs.src.document_processor import DocumentProcessor
 from faiss_vs.src.config import settings
+from .answer_cache import AnswerCache, normalize_question
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+class _HistoryItem:
+    """Запись истории разговора (время форматируется только при чтении)"""
+
+    __slots__ = ('timestamp', 'question', 'answer', 'sources_count', 'client_id')
+
+    def __init__(self, question: str, answer: str, sources_count: int, client_id: str):
+        self.timestamp = time.time()
+        self.question = question
+        self.answer = answer
+        self.sources_count = sources_count
+        self.client_id = client_id
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Представление записи для API"""
+        return {
+            'timestamp': datetime.fromtimestamp(self.timestamp).isoformat(timespec='seconds'),
+            'question': self.question,
+            'answer': self.answer,
+            'sources_count': self.sources_count,
+            'client_id': self.client_id
+        }
+
+
 class LKAssistant:
     """
     Нейроассистент для личного кабинета
     Использует FAISS RAG для поиска информации в документах клиента
     """
 
+    # Базовые предлагаемые вопросы: до и после вопросов по категориям
+    SUGGESTIONS_HEAD = (
+        "Что содержится в моих документах?",
+        "Покажи последние загруженные файлы",
+    )
+    SUGGESTIONS_TAIL = (
+        "Найди информацию о проекте",
+        "Покажи техническую документацию",
+        "Есть ли информация о ценах?"
+    )
+
+    # Время жизни кэша категорий и предложений (секунды)
+    CATEGORIES_CACHE_TTL = 60
+
+    # Сколько последних сообщений хранится в истории разговора
+    MAX_HISTORY_LENGTH = 1000
+
+    # Время жизни кэша статистики индекса (секунды)
+    STATS_CACHE_TTL = 2.0
+
+    # Размер и время жизни (секунды) кэша ответов на уже заданные вопросы
+    ANSWER_CACHE_SIZE = 256
+    ANSWER_CACHE_TTL = 300
+
     def __init__(self, client_id: str, assistant_name: str = "Помощник ЛК"):
         self.client_id = client_id
         self.assistant_name = assistant_name
-        self.conversation_history = []
+        self.conversation_history = deque(maxlen=self.MAX_HISTORY_LENGTH)
+
+        # (expires_at, категории, предложения) — см. _get_categories_and_suggestions
+        self._categories_cache: Optional[Tuple[float, Tuple[str, ...], Tuple[str, ...]]] = None
+        # (expires_at, статистика индекса) — см. _get_stats
+        self._stats_cache: Optional[Tuple[float, Dict[str, Any]]] = None
+        # Ответы на уже заданные вопросы: (нормализованный вопрос, context_limit) -> (ответ, источники)
+        self._answer_cache = AnswerCache(self.ANSWER_CACHE_SIZE, self.ANSWER_CACHE_TTL)
 
         # Инициализируем процессор документов
         self.document_processor = DocumentProcessor(client_id=client_id)
@@ -40,10 +100,40 @@ class LKAssistant:
 
         logger.info(f"Ассистент инициализирован для клиента {client_id}")
 
+    def _get_stats(self) -> Dict[str, Any]:
+        """
+        Возвращает статистику индекса клиента
+
+        get_index_statistics обходит все чанки, поэтому результат переиспользуется
+        в течение STATS_CACHE_TTL секунд
+        """
+        now = time.monotonic()
+        cached = self._stats_cache
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        stats = self.document_processor.get_index_statistics()
+        self._stats_cache = (now + self.STATS_CACHE_TTL, stats)
+        return stats
+
+    def invalidate_stats(self):
+        """Сбрасывает кэш статистики (например, после загрузки новых документов)"""
+        self._stats_cache = None
+        self.refresh_categories()
+        self.clear_answer_cache()
+
+    def has_cached_answer(self, question: str, context_limit: int = 3) -> bool:
+        """Есть ли готовый ответ на вопрос: тогда ask не обращается к индексу и модели"""
+        return (normalize_question(question), context_limit) in self._answer_cache
+
+    def clear_answer_cache(self):
+        """Сбрасывает кэш готовых ответов (например, при перезагрузке индекса)"""
+        self._answer_cache.clear()
+
     def _check_client_data(self) -> bool:
         """Проверяет, есть ли индексированные данные для клиента"""
         try:
-            stats = self.document_processor.get_index_statistics()
+            stats = self._get_stats()
             if stats.get('status') == 'ready' and stats.get('total_chunks', 0) > 0:
                 logger.info(f"Найдено {stats['total_chunks']} чанков для клиента {self.client_id}")
                 return True
@@ -65,15 +155,45 @@ class LKAssistant:
         Returns:
             Dict с ответом и метаданными
         """
+        for event, payload in self.ask_stream(question, context_limit=context_limit):
+            if event == 'done':
+                return payload
+
+    def ask_stream(self, question: str, context_limit: int = 3) -> Iterator[Tuple[str, Any]]:
+        """
+        Отвечает на вопрос по частям
+
+        Yields:
+            ('delta', str) — очередной фрагмент текста ответа, по мере формирования;
+            ('done', dict) — в конце, тот же словарь, что возвращает ask()
+        """
         if not self.is_ready:
-            return {
+            yield 'done', {
                 'success': False,
                 'answer': "Извините, для вашего аккаунта еще нет загруженных документов. Обратитесь к администратору.",
                 'sources': [],
                 'error': 'no_data'
             }
+            return
 
         try:
+            # Тот же вопрос уже задавался — отвечаем без поиска по индексу
+            cache_key = (normalize_question(question), context_limit)
+            cached = self._answer_cache.get(cache_key)
+            if cached is not None:
+                answer, sources = cached
+                self._add_to_history(question, answer, sources)
+                yield 'delta', answer
+                yield 'done', {
+                    'success': True,
+                    'answer': answer,
+                    'sources': list(sources),
+                    'query': question,
+                    'found_documents': len(sources),
+                    'cached': True
+                }
+                return
+
             # Ищем релевантные документы
             search_results = self.document_processor.search_documents(
                 query=question,
@@ -82,30 +202,42 @@ class LKAssistant:
             )
 
             if not search_results:
-                return {
+                answer = "Я не нашел информации по вашему вопросу в загруженных документах. Попробуйте переформулировать вопрос или обратиться к специалисту."
+                yield 'delta', answer
+                yield 'done', {
                     'success': True,
-                    'answer': f"Я не нашел информации по вашему вопросу в загруженных документах. Попробуйте переформулировать вопрос или обратиться к специалисту.",
+                    'answer': answer,
                     'sources': [],
                     'query': question
                 }
+                return
 
-            # Формируем ответ на основе найденных документов
-            answer = self._generate_answer(question, search_results)
+            # Формируем ответ на основе найденных документов, отдавая его по частям
+            parts = []
+            for part in self._iter_answer_parts(question, search_results):
+                parts.append(part)
+                yield 'delta', part
+            answer = "".join(parts)
 
             # Сохраняем в историю
             self._add_to_history(question, answer, search_results)
 
-            return {
+            sources = self._format_sources(search_results)
+            self._answer_cache.put(cache_key, (answer, sources))
+
+            yield 'done', {
                 'success': True,
                 'answer': answer,
-                'sources': self._format_sources(search_results),
+                'sources': list(sources),
                 'query': question,
                 'found_documents': len(search_results)
             }
 
         except Exception as e:
             logger.error(f"Ошибка при обработке вопроса: {e}")
-            return {
+            # Индекс мог измениться — не доверяем закэшированной статистике
+            self.invalidate_stats()
+            yield 'done', {
                 'success': False,
                 'answer': "Произошла ошибка при поиске ответа. Попробуйте еще раз.",
                 'sources': [],
@@ -120,39 +252,26 @@ class LKAssistant:
         if not search_results:
             return "Информация не найдена."
 
-        # Извлекаем самые релевантные фрагменты
-        relevant_texts = []
-        for result in search_results:
-            text = result.get('text', '')
-            score = result.get('score', 0)
-            source = result.get('source_file', 'Неизвестный источник')
+        return "".join(self._iter_answer_parts(question, search_results))
 
-            # Добавляем фрагмент с указанием источника
-            relevant_texts.append(f"[Из документа '{source}'] {text[:300]}...")
+    def _iter_answer_parts(self, question: str, search_results: List[Dict]) -> Iterator[str]:
+        """Фрагменты ответа по порядку: вступление, найденные отрывки, заключение"""
+        yield "На основе найденной информации в ваших документах:\n\n"
 
-        # Формируем ответ
-        answer_parts = [
-            f"На основе найденной информации в ваших документах:",
-            "",
-        ]
-
-        # Добавляем релевантные фрагменты
-        for i, text in enumerate(relevant_texts, 1):
-            answer_parts.append(f"{i}. {text}")
-            answer_parts.append("")
-
-        # Добавляем примечание
-        answer_parts.append(
-            "📝 Это информация из ваших загруженных документов. Если нужны уточнения, задайте более конкретный вопрос.")
+        # Нумерованные фрагменты с указанием источника, каждый отделен пустой строкой
+        for i, result in enumerate(search_results, 1):
+            yield (
+                f"{i}. [Из документа '{result.get('source_file', 'Неизвестный источник')}'] "
+                f"{result.get('text', '')[:300]}...\n\n"
+            )
 
-        return "\n".join(answer_parts)
+        yield "📝 Это информация из ваших загруженных документов. Если нужны уточнения, задайте более конкретный вопрос."
 
     def _format_sources(self, search_results: List[Dict]) -> List[Dict]:
         """Форматирует источники для ответа"""
-        sources = []
-        for result in search_results:
-            metadata = result.get('metadata', {})
-            source = {
+        # "for metadata in [...]" связывает метаданные один раз на результат
+        return [
+            {
                 'file': result.get('source_file', 'Неизвестный файл'),
                 'score': round(result.get('score', 0), 3),
                 'category': metadata.get('category', 'Без категории'),
@@ -160,25 +279,22 @@ class LKAssistant:
                 'url': metadata.get('source_url', ''),
                 'date': metadata.get('date', '')
             }
-            sources.append(source)
-        return sources
+            for result in search_results
+            for metadata in [result.get('metadata', {})]
+        ]
 
     def _add_to_history(self, question: str, answer: str, sources: List[Dict]):
         """Добавляет взаимодействие в историю"""
-        self.conversation_history.append({
-            'timestamp': datetime.now().isoformat(),
-            'question': question,
-            'answer': answer,
-            'sources_count': len(sources),
-            'client_id': self.client_id
-        })
+        self.conversation_history.append(
+            _HistoryItem(question, answer, len(sources), self.client_id)
+        )
 
     def get_client_stats(self) -> Dict[str, Any]:
         """Возвращает статистику по данным клиента"""
         if not self.is_ready:
             return {'error': 'Нет данных для клиента'}
 
-        stats = self.document_processor.get_index_statistics()
+        stats = self._get_stats()
 
         return {
             'client_id': self.client_id,
@@ -214,45 +330,52 @@ class LKAssistant:
 
     def get_conversation_history(self, limit: int = 10) -> List[Dict]:
         """Возвращает историю разговора"""
-        return self.conversation_history[-limit:] if limit else self.conversation_history
+        history = self.conversation_history
+        start = max(0, len(history) - limit) if limit else 0
+        return [item.to_dict() for item in islice(history, start, None)]
 
     def clear_history(self):
         """Очищает историю разговора"""
-        self.conversation_history = []
+        self.conversation_history.clear()
         logger.info(f"История разговора очищена для клиента {self.client_id}")
 
-    def suggest_questions(self) -> List[str]:
-        """Предлагает вопросы на основе доступных данных"""
-        if not self.is_ready:
-            return ["Сначала загрузите документы в систему"]
+    def _get_categories_and_suggestions(self) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+        """Возвращает категории и предлагаемые вопросы, пересчитывая их не чаще раза в CATEGORIES_CACHE_TTL"""
+        now = time.monotonic()
+        cached = self._categories_cache
+        if cached is not None and cached[0] > now:
+            return cached[1], cached[2]
 
-        stats = self.document_processor.get_index_statistics()
-        categories = list(stats.get('categories_distribution', {}).keys())
+        stats = self._get_stats()
+        categories = tuple(stats.get('categories_distribution', {}).keys())
 
-        suggestions = [
-            "Что содержится в моих документах?",
-            "Покажи последние загруженные файлы",
-        ]
+        # Добавляем вопросы по первым 3 категориям
+        suggestions = (
+            self.SUGGESTIONS_HEAD
+            + tuple(f"Что есть в категории '{category}'?" for category in categories[:3])
+            + self.SUGGESTIONS_TAIL
+        )
+
+        self._categories_cache = (now + self.CATEGORIES_CACHE_TTL, categories, suggestions)
+        return categories, suggestions
 
-        # Добавляем вопросы по категориям
-        for category in categories[:3]:  # Берем первые 3 категории
-            suggestions.append(f"Что есть в категории '{category}'?")
+    def refresh_categories(self):
+        """Сбрасывает кэш категорий и предлагаемых вопросов"""
+        self._categories_cache = None
 
-        suggestions.extend([
-            "Найди информацию о проекте",
-            "Покажи техническую документацию",
-            "Есть ли информация о ценах?"
-        ])
+    def suggest_questions(self) -> List[str]:
+        """Предлагает вопросы на основе доступных данных"""
+        if not self.is_ready:
+            return ["Сначала загрузите документы в систему"]
 
-        return suggestions
+        return list(self._get_categories_and_suggestions()[1])
 
     def get_available_categories(self) -> List[str]:
         """Возвращает список доступных категорий документов"""
         if not self.is_ready:
             return []
 
-        stats = self.document_processor.get_index_statistics()
-        return list(stats.get('categories_distribution', {}).keys())
+        return list(self._get_categories_and_suggestions()[0])
 
     def get_recent_documents(self, limit: int = 5) -> List[Dict]:
         """Возвращает список недавно добавленных документов"""
@@ -262,29 +385,26 @@ class LKAssistant:
         try:
             all_chunks = self.document_processor.faiss_manager.get_all_chunks()
 
-            # Группируем по файлам и берем последние
+            # Группируем по файлам за один проход
             files_info = {}
+            files_info_get = files_info.get
             for chunk in all_chunks:
                 filename = chunk.get('source_file', '')
-                if filename not in files_info:
+                entry = files_info_get(filename)
+                if entry is None:
                     metadata = chunk.get('metadata', {})
-                    files_info[filename] = {
+                    entry = files_info[filename] = {
                         'filename': filename,
                         'category': metadata.get('category', 'Без категории'),
                         'title': metadata.get('title', ''),
-                        'date': metadata.get('processing_date', ''),
+                        # Ключ 'date' всегда строка — нужен для itemgetter ниже
+                        'date': metadata.get('processing_date') or '',
                         'chunks_count': 0
                     }
-                files_info[filename]['chunks_count'] += 1
-
-            # Сортируем по дате и возвращаем последние
-            recent_files = sorted(
-                files_info.values(),
-                key=lambda x: x.get('date', ''),
-                reverse=True
-            )
+                entry['chunks_count'] += 1
 
-            return recent_files[:limit]
+            # Берем последние по дате без полной сортировки
+            return heapq.nlargest(limit, files_info.values(), key=itemgetter('date'))
 
         except Exception as e:
             logger.error(f"Ошибка получения недавних документов: {e}")
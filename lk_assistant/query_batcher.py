@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Объединение embeddings вопросов от параллельных запросов в пакеты
+Файл: lk_assistant/query_batcher.py
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Tuple
+
+from faiss_vs.src.vectorstore.faiss_manager import MAX_CACHED_QUERY_LENGTH
+
+logger = logging.getLogger(__name__)
+
+
+class QueryEmbeddingBatcher:
+    """
+    Собирает вопросы, пришедшие в течение короткого окна, и считает их embeddings
+    одним вызовом модели
+
+    Результат кладется в кэш embeddings запросов FAISSManager, поэтому дальнейший
+    LKAssistant.ask каждого запроса выполняется как обычно, но без прогона модели.
+    Поиск и формирование ответа остаются параллельными в потоках запросов
+    """
+
+    def __init__(self, max_batch_size: int = 16, max_wait_ms: float = 15):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+
+        self._queue: "queue.Queue[Tuple[object, str, Future]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="QueryEmbeddingBatcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, faiss_manager, question: str) -> Future:
+        """
+        Ставит вопрос в очередь на расчет embedding
+
+        Returns:
+            Future, завершающийся, когда embedding попал в кэш
+        """
+        future = Future()
+        if len(question) > MAX_CACHED_QUERY_LENGTH:
+            # Такие запросы не кэшируются — считать их заранее бесполезно
+            future.set_result(None)
+        elif faiss_manager.has_cached_query_embedding(question):
+            # Embedding уже в кэше — ждать окно пакета незачем
+            future.set_result(None)
+        else:
+            self._queue.put((faiss_manager, question, future))
+        return future
+
+    def _collect_batch(self) -> List[Tuple[object, str, Future]]:
+        """
+        Ждет первый элемент, затем добирает пакет до max_batch_size или истечения окна
+
+        Окно открывается, только если к этому моменту в очереди уже есть второй вопрос:
+        одиночный запрос обрабатывается сразу, без ожидания
+        """
+        batch = [self._queue.get()]
+        if self._queue.empty():
+            return batch
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            try:
+                self._process_batch(batch)
+            except Exception as e:
+                logger.error(f"Ошибка обработки пакета embeddings: {e}")
+            finally:
+                # Запросы ждут свои futures: завершаем их при любом исходе,
+                # а поток пакетирования продолжает работу
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+
+    def _process_batch(self, batch: List[Tuple[object, str, Future]]):
+        # Менеджеры с одной моделью и нормализацией дают одинаковые embeddings:
+        # их вопросы считаются одним вызовом через любой из менеджеров группы
+        groups: Dict[Tuple[str, bool], Tuple[object, Dict[str, List[Future]]]] = {}
+        for faiss_manager, question, future in batch:
+            key = (faiss_manager.model_name, faiss_manager.index_type == "FlatIP")
+            group = groups.setdefault(key, (faiss_manager, {}))
+            group[1].setdefault(question, []).append(future)
+
+        for faiss_manager, futures_by_question in groups.values():
+            try:
+                faiss_manager.create_query_embeddings(list(futures_by_question))
+            except Exception as e:
+                # Не страшно: каждый запрос посчитает свой embedding сам
+                logger.error(f"Ошибка пакетного расчета embeddings: {e}")
+
+            for futures in futures_by_question.values():
+                for future in futures:
+                    future.set_result(None)
@@ -1,667 +1,297 @@
-from flask import Blueprint, request, jsonify, render_template_string
-from .assistant_manager import get_assistant_manager
+from flask import Blueprint, request, current_app, send_from_directory, stream_with_context
+from .assistant_manager import AssistantManager, get_assistant_manager
+from .lk_assistant import LKAssistant
+from .query_batcher import QueryEmbeddingBatcher
+from faiss_vs.src.json_response import dumps as _dumps, json_response as _json
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial, wraps
+from itertools import islice
+from pathlib import Path
+from typing import Annotated, Any, Dict, Final, List, Optional
+import gzip
+import hashlib
 import logging
+import os
+import threading
+import time
+import msgspec
+from werkzeug.exceptions import HTTPException
+
+# Brotli сжимает страницу чата заметно лучше gzip, но необязателен
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
 
 # Создаем Blueprint для ассистента
-bp = Blueprint('lk_assistant', __name__)
+bp: Final[Blueprint] = Blueprint('lk_assistant', __name__)
 
 # Получаем менеджер ассистентов
-assistant_manager = get_assistant_manager()
-
-
-@bp.route('/assistant/index', methods=['GET'])
-def index():
-    """Информация о нейроассистенте"""
-    return jsonify({
-        "status": "ok",
-        "service": "LK Assistant",
-        "description": "Нейроассистент для личного кабинета на основе FAISS RAG",
-        "version": "1.0.0",
-        "cache_stats": assistant_manager.get_cache_stats(),
-        "endpoints": {
-            "/assistant/ask": "POST - Задать вопрос ассистенту",
-            "/assistant/stats": "GET - Статистика клиента",
-            "/assistant/suggestions": "GET - Предлагаемые вопросы",
-            "/assistant/history": "GET - История разговора",
-            "/assistant/search_category": "POST - Поиск в категории",
-            "/assistant/categories": "GET - Список категорий",
-            "/assistant/recent_documents": "GET - Недавние документы",
-            "/assistant/health": "GET - Проверка здоровья",
-            "/assistant/reload": "POST - Перезагрузка ассистента",
-            "/assistant/manager_stats": "GET - Статистика менеджера",
-            "/assistant/clear_cache": "POST - Очистка кэша",
-            "/assistant/bulk_operations": "POST - Массовые операции"
-        }
-    })
-
-
-@bp.route('/assistant/chat', methods=['GET'])
-def chat_interface():
-    """Веб-интерфейс для чата с ассистентом"""
-    # Получаем client_id из параметров URL
-    client_id = request.args.get('client_id', '6a2502fa-caaa-11e3-9af3-e41f13beb1d2')
-
-    # HTML шаблон встроен прямо в код для простоты
-    html_template = '''
-<!DOCTYPE html>
-<html lang="ru">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>🤖 Нейроассистент ЛК</title>
-    <style>
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-
-        body {
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            min-height: 100vh;
-            padding: 20px;
-        }
-
-        .container {
-            max-width: 1000px;
-            margin: 0 auto;
-            background: white;
-            border-radius: 20px;
-            box-shadow: 0 20px 40px rgba(0,0,0,0.1);
-            overflow: hidden;
-            height: calc(100vh - 40px);
-            display: flex;
-            flex-direction: column;
-        }
-
-        .header {
-            background: linear-gradient(135deg, #2c3e50, #3498db);
-            color: white;
-            padding: 20px 30px;
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-        }
-
-        .header h1 {
-            font-size: 24px;
-            display: flex;
-            align-items: center;
-            gap: 10px;
-        }
-
-        .status {
-            background: rgba(255,255,255,0.2);
-            padding: 8px 16px;
-            border-radius: 20px;
-            font-size: 14px;
-        }
-
-        .chat-container {
-            flex: 1;
-            display: flex;
-            flex-direction: column;
-            overflow: hidden;
-        }
-
-        .chat-messages {
-            flex: 1;
-            padding: 20px;
-            overflow-y: auto;
-            background: #f8f9fa;
-            scroll-behavior: smooth;
-        }
-
-        .message {
-            margin-bottom: 20px;
-            display: flex;
-            align-items: flex-start;
-            gap: 12px;
-        }
-
-        .message.user {
-            flex-direction: row-reverse;
-        }
-
-        .message-avatar {
-            width: 40px;
-            height: 40px;
-            border-radius: 50%;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            font-size: 18px;
-            flex-shrink: 0;
-        }
-
-        .message.user .message-avatar {
-            background: #3498db;
-            color: white;
-        }
-
-        .message.assistant .message-avatar {
-            background: #2ecc71;
-            color: white;
-        }
+assistant_manager: Final[AssistantManager] = get_assistant_manager()
+
+# Embeddings вопросов параллельных /assistant/ask считаются пакетами
+query_batcher: Final[QueryEmbeddingBatcher] = QueryEmbeddingBatcher(max_batch_size=16, max_wait_ms=15)
+
+# Статическая часть ответа /assistant/index, собирается один раз при импорте
+_INDEX_INFO = {
+    "status": "ok",
+    "service": "LK Assistant",
+    "description": "Нейроассистент для личного кабинета на основе FAISS RAG",
+    "version": "1.0.0",
+    "endpoints": {
+        "/assistant/ask": "POST - Задать вопрос ассистенту",
+        "/assistant/ask_stream": "POST - Задать вопрос, ответ потоком Server-Sent Events",
+        "/assistant/stats": "GET - Статистика клиента",
+        "/assistant/suggestions": "GET - Предлагаемые вопросы",
+        "/assistant/history": "GET - История разговора",
+        "/assistant/search_category": "POST - Поиск в категории",
+        "/assistant/categories": "GET - Список категорий",
+        "/assistant/recent_documents": "GET - Недавние документы",
+        "/assistant/health": "GET - Проверка здоровья",
+        "/assistant/bootstrap": "GET - Статус и предложения для страницы чата",
+        "/assistant/reload": "POST - Перезагрузка ассистента",
+        "/assistant/manager_stats": "GET - Статистика менеджера",
+        "/assistant/clear_cache": "POST - Очистка кэша",
+        "/assistant/bulk_operations": "POST - Массовые операции"
+    }
+}
 
-        .message-content {
-            max-width: 70%;
-            padding: 15px 20px;
-            border-radius: 18px;
-            line-height: 1.5;
-            word-wrap: break-word;
-        }
 
-        .message.user .message-content {
-            background: #3498db;
-            color: white;
-            border-bottom-right-radius: 5px;
-        }
+# Тела частых ответов об ошибках не меняются — сериализуем их один раз
+_ERROR_NO_CLIENT_ID = _dumps({"success": False, "error": "Не указан client_id"})
+_ERROR_EMPTY_BODY = _dumps({"success": False, "error": "Нет данных в запросе"})
+_ERROR_CLEAR_CACHE_NOT_CONFIRMED = _dumps({
+    "success": False,
+    "error": "Для очистки кэша требуется подтверждение: {\"confirm\": true}"
+})
 
-        .message.assistant .message-content {
-            background: white;
-            color: #2c3e50;
-            border: 1px solid #e0e0e0;
-            border-bottom-left-radius: 5px;
-        }
 
-        .message-time {
-            font-size: 12px;
-            opacity: 0.7;
-            margin-top: 5px;
-        }
+def _error_response(body: bytes, status: int = 400):
+    """Ответ с заранее сериализованным телом ошибки"""
+    return current_app.response_class(body, status=status, mimetype="application/json")
 
-        .message-sources {
-            margin-top: 10px;
-            padding: 10px;
-            background: rgba(52, 152, 219, 0.1);
-            border-radius: 8px;
-            font-size: 12px;
-        }
 
-        .source-link {
-            color: #3498db;
-            text-decoration: none;
-            word-break: break-all;
-        }
+# Схемы тел POST-запросов: разбор JSON и проверка полей выполняются одним вызовом декодера
+NonEmptyStr = Annotated[str, msgspec.Meta(min_length=1)]
 
-        .source-link:hover {
-            text-decoration: underline;
-        }
 
-        .chat-input-area {
-            background: white;
-            border-top: 1px solid #e0e0e0;
-            padding: 20px;
-        }
+class AskRequest(msgspec.Struct):
+    client_id: NonEmptyStr
+    question: NonEmptyStr
+    context_limit: Annotated[int, msgspec.Meta(ge=1)] = 3
 
-        .input-group {
-            display: flex;
-            gap: 12px;
-            align-items: flex-end;
-        }
 
-        .input-container {
-            flex: 1;
-            position: relative;
-        }
+class ClientRequest(msgspec.Struct):
+    client_id: NonEmptyStr
 
-        #messageInput {
-            width: 100%;
-            padding: 15px 20px;
-            border: 2px solid #e0e0e0;
-            border-radius: 25px;
-            font-size: 16px;
-            resize: none;
-            min-height: 50px;
-            max-height: 120px;
-            outline: none;
-            transition: border-color 0.3s;
-        }
 
-        #messageInput:focus {
-            border-color: #3498db;
-        }
+class SearchCategoryRequest(msgspec.Struct):
+    client_id: NonEmptyStr
+    query: NonEmptyStr
+    category: NonEmptyStr
 
-        #sendButton {
-            background: #3498db;
-            color: white;
-            border: none;
-            border-radius: 50%;
-            width: 50px;
-            height: 50px;
-            cursor: pointer;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            font-size: 20px;
-            transition: background 0.3s;
-        }
 
-        #sendButton:hover:not(:disabled) {
-            background: #2980b9;
-        }
+class ClearCacheRequest(msgspec.Struct):
+    confirm: bool = False
 
-        #sendButton:disabled {
-            background: #95a5a6;
-            cursor: not-allowed;
-        }
 
-        .suggestions {
-            display: flex;
-            gap: 8px;
-            margin-bottom: 15px;
-            flex-wrap: wrap;
-        }
+class BulkRequest(msgspec.Struct):
+    operation: NonEmptyStr
+    client_ids: List[str] = msgspec.field(default_factory=list)
+    force: bool = False
+    max_concurrency: Optional[Annotated[int, msgspec.Meta(ge=1)]] = None
 
-        .suggestion-chip {
-            background: #e3f2fd;
-            color: #1976d2;
-            padding: 8px 16px;
-            border-radius: 20px;
-            font-size: 14px;
-            cursor: pointer;
-            border: none;
-            transition: background 0.3s;
-        }
 
-        .suggestion-chip:hover {
-            background: #bbdefb;
-        }
+_ASK_DECODER = msgspec.json.Decoder(AskRequest)
+_CLIENT_DECODER = msgspec.json.Decoder(ClientRequest)
+_SEARCH_CATEGORY_DECODER = msgspec.json.Decoder(SearchCategoryRequest)
+# Подтверждение принимается и строкой/числом ("true", 1), как до перехода на msgspec
+_CLEAR_CACHE_DECODER = msgspec.json.Decoder(ClearCacheRequest, strict=False)
+_BULK_DECODER = msgspec.json.Decoder(BulkRequest)
 
-        .typing-indicator {
-            display: none;
-            align-items: center;
-            gap: 8px;
-            margin-bottom: 20px;
-        }
-
-        .typing-indicator.show {
-            display: flex;
-        }
-
-        .typing-dots {
-            display: flex;
-            gap: 4px;
-        }
-
-        .typing-dot {
-            width: 8px;
-            height: 8px;
-            border-radius: 50%;
-            background: #95a5a6;
-            animation: typing 1.4s infinite ease-in-out;
-        }
 
-        .typing-dot:nth-child(1) { animation-delay: -0.32s; }
-        .typing-dot:nth-child(2) { animation-delay: -0.16s; }
-
-        @keyframes typing {
-            0%, 80%, 100% {
-                transform: scale(0);
-                opacity: 0.5;
-            }
-            40% {
-                transform: scale(1);
-                opacity: 1;
-            }
-        }
-
-        .error-message {
-            background: #fee;
-            color: #c62828;
-            padding: 15px;
-            border-radius: 8px;
-            margin: 10px 0;
-            border-left: 4px solid #c62828;
-        }
-
-        .welcome-message {
-            text-align: center;
-            padding: 40px 20px;
-            color: #666;
-        }
-
-        .welcome-message h2 {
-            margin-bottom: 10px;
-            color: #2c3e50;
-        }
-
-        .markdown-content h1, .markdown-content h2, .markdown-content h3 {
-            margin: 15px 0 10px 0;
-            color: #2c3e50;
-        }
-
-        .markdown-content p {
-            margin: 10px 0;
-            line-height: 1.6;
-        }
+def _decode_body(decoder):
+    """
+    Разбирает тело запроса по схеме декодера
 
-        .markdown-content strong {
-            font-weight: 600;
-        }
+    Returns:
+        (объект запроса, None) или (None, ответ 400 с описанием ошибки)
+    """
+    body = request.get_data(cache=False)
+    if not body:
+        return None, _error_response(_ERROR_EMPTY_BODY)
 
-        .markdown-content a {
-            color: #3498db;
-            text-decoration: none;
-            word-break: break-all;
-        }
+    try:
+        return decoder.decode(body), None
+    except msgspec.DecodeError as e:
+        return None, _json({
+            "success": False,
+            "error": f"Некорректный запрос: {e}"
+        }, 400)
 
-        .markdown-content a:hover {
-            text-decoration: underline;
-        }
 
-        .markdown-content ul {
-            margin: 10px 0;
-            padding-left: 20px;
-        }
+# Кэш ответов GET-эндпоинтов, данные которых меняются медленно.
+# Ключ содержит версию данных клиента, а для эндпоинтов, зависящих от истории
+# разговора, еще и версию истории: ее увеличение делает такие записи недоступными
+RESPONSE_CACHE_MAX_ENTRIES = 4096
+_response_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_response_cache_lock = threading.Lock()
+_client_versions = {}
+_history_versions = {}
+_global_version = 0
 
-        .markdown-content li {
-            margin: 5px 0;
-        }
 
-        @media (max-width: 768px) {
-            .container {
-                height: 100vh;
-                border-radius: 0;
-                margin: 0;
-            }
+def _reset_response_cache():
+    global _global_version
+    _global_version += 1
+    _client_versions.clear()
+    _history_versions.clear()
+    _response_cache.clear()
 
-            body {
-                padding: 0;
-            }
 
-            .message-content {
-                max-width: 85%;
-            }
-
-            .header {
-                padding: 15px 20px;
-            }
-
-            .header h1 {
-                font-size: 20px;
-            }
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>
-                🤖 Нейроассистент ЛК
-            </h1>
-            <div class="status" id="status">
-                Подключение...
-            </div>
-        </div>
-
-        <div class="chat-container">
-            <div class="chat-messages" id="chatMessages">
-                <div class="welcome-message">
-                    <h2>Добро пожаловать!</h2>
-                    <p>Я ваш персональный ассистент. Могу помочь найти документы, ссылки и ответить на вопросы по вашим проектам.</p>
-                </div>
-            </div>
-
-            <div class="chat-input-area">
-                <div class="suggestions" id="suggestions">
-                    <!-- Предложения будут загружены динамически -->
-                </div>
-
-                <div class="input-group">
-                    <div class="input-container">
-                        <textarea 
-                            id="messageInput" 
-                            placeholder="Задайте вопрос или попросите найти документ..."
-                            rows="1"
-                        ></textarea>
-                    </div>
-                    <button id="sendButton" title="Отправить сообщение">
-                        ➤
-                    </button>
-                </div>
-            </div>
-        </div>
-    </div>
-
-    <script>
-        class AssistantChat {
-            constructor() {
-                this.clientId = {{ client_id|tojson }};
-                this.messagesContainer = document.getElementById('chatMessages');
-                this.messageInput = document.getElementById('messageInput');
-                this.sendButton = document.getElementById('sendButton');
-                this.statusElement = document.getElementById('status');
-                this.suggestionsContainer = document.getElementById('suggestions');
-
-                this.init();
-            }
+def invalidate_client_cache(client_id=None, history_only=False):
+    """
+    Сбрасывает кэш ответов клиента (или всех клиентов, если client_id не указан)
 
-            init() {
-                this.setupEventListeners();
-                this.loadSuggestions();
-                this.checkAssistantHealth();
-            }
+    При history_only=True сбрасываются только ответы, зависящие от истории разговора
+    """
+    with _response_cache_lock:
+        if client_id is None:
+            _reset_response_cache()
+            return
+        versions = _history_versions if history_only else _client_versions
+        versions[client_id] = versions.get(client_id, 0) + 1
+        # Версии нельзя просто удалить (старые записи снова стали бы доступны),
+        # поэтому при переполнении сбрасываем кэш целиком
+        if len(versions) > RESPONSE_CACHE_MAX_ENTRIES:
+            _reset_response_cache()
+
+
+def _response_cache_key(history_dependent):
+    client_id: Optional[str] = request.args.get("client_id")
+    return (
+        request.path,
+        tuple(sorted(request.args.items(multi=True))),
+        _global_version,
+        _client_versions.get(client_id, 0),
+        _history_versions.get(client_id, 0) if history_dependent else 0
+    )
+
+
+def _get_cached_response(key):
+    with _response_cache_lock:
+        cached = _response_cache.get(key)
+        if cached is None:
+            return None
+        if cached[0] <= time.monotonic():
+            del _response_cache[key]
+            return None
+        _response_cache.move_to_end(key)
+    return current_app.response_class(cached[1], mimetype="application/json")
+
+
+def _store_response(key, response, ttl):
+    # Кэшируем только успешные ответы; ошибки (кортеж с кодом) пропускаем
+    if isinstance(response, tuple) or response.status_code != 200:
+        return
+    with _response_cache_lock:
+        _response_cache[key] = (time.monotonic() + ttl, response.get_data())
+        _response_cache.move_to_end(key)
+        if len(_response_cache) > RESPONSE_CACHE_MAX_ENTRIES:
+            _response_cache.popitem(last=False)
+
+
+def response_cached(ttl, history_dependent=False):
+    """
+    Кэширует JSON-ответ GET-обработчика на ttl секунд (ключ — путь и параметры запроса)
 
-            setupEventListeners() {
-                this.sendButton.addEventListener('click', () => this.sendMessage());
-
-                this.messageInput.addEventListener('keydown', (e) => {
-                    if (e.key === 'Enter' && !e.shiftKey) {
-                        e.preventDefault();
-                        this.sendMessage();
-                    }
-                });
-
-                // Автоматическое изменение высоты textarea
-                this.messageInput.addEventListener('input', (e) => {
-                    e.target.style.height = 'auto';
-                    e.target.style.height = e.target.scrollHeight + 'px';
-                });
-            }
+    history_dependent: ответ зависит от истории разговора и сбрасывается после каждого вопроса
+    """
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(*args, **kwargs):
+            key = _response_cache_key(history_dependent)
+            cached = _get_cached_response(key)
+            if cached is not None:
+                return cached
+            response = handler(*args, **kwargs)
+            _store_response(key, response, ttl)
+            return response
+        return wrapper
+    return decorator
+
+
+@bp.errorhandler(Exception)
+def handle_exception(e):
+    """Единый JSON-ответ на необработанные ошибки обработчиков ассистента"""
+    if isinstance(e, HTTPException):
+        return e
+    logging.exception("Ошибка в %s", request.path)
+    return _json({
+        "success": False,
+        "error": f"Внутренняя ошибка сервера: {str(e)}"
+    }, 500)
 
-            async checkAssistantHealth() {
-                try {
-                    const response = await fetch(`/assistant/health?client_id=${this.clientId}`);
-                    const data = await response.json();
-
-                    if (data.success && data.health.is_ready) {
-                        this.statusElement.textContent = '🟢 Готов к работе';
-                        this.statusElement.style.background = 'rgba(46, 204, 113, 0.2)';
-                    } else {
-                        this.statusElement.textContent = '🟡 Нет данных';
-                        this.statusElement.style.background = 'rgba(241, 196, 15, 0.2)';
-                    }
-                } catch (error) {
-                    this.statusElement.textContent = '🔴 Ошибка';
-                    this.statusElement.style.background = 'rgba(231, 76, 60, 0.2)';
-                }
-            }
 
-            async loadSuggestions() {
-                try {
-                    const response = await fetch(`/assistant/suggestions?client_id=${this.clientId}`);
-                    const data = await response.json();
-
-                    if (data.success && data.suggestions) {
-                        this.renderSuggestions(data.suggestions.slice(0, 4)); // Показываем первые 4
-                    }
-                } catch (error) {
-                    console.error('Ошибка загрузки предложений:', error);
-                }
-            }
+@bp.route('/assistant/index', methods=['GET'])
+def index():
+    """Информация о нейроассистенте"""
+    return _json({**_INDEX_INFO, "cache_stats": assistant_manager.get_cache_stats()})
 
-            renderSuggestions(suggestions) {
-                this.suggestionsContainer.innerHTML = '';
-
-                suggestions.forEach(suggestion => {
-                    const chip = document.createElement('button');
-                    chip.className = 'suggestion-chip';
-                    chip.textContent = suggestion;
-                    chip.addEventListener('click', () => {
-                        this.messageInput.value = suggestion;
-                        this.sendMessage();
-                    });
-                    this.suggestionsContainer.appendChild(chip);
-                });
-            }
 
-            async sendMessage() {
-                const message = this.messageInput.value.trim();
-                if (!message || this.sendButton.disabled) return;
-
-                // Добавляем сообщение пользователя
-                this.addMessage(message, 'user');
-
-                // Очищаем поле ввода и блокируем кнопку
-                this.messageInput.value = '';
-                this.messageInput.style.height = 'auto';
-                this.setSendingState(true);
-
-                // Показываем индикатор печати
-                this.showTypingIndicator();
-
-                try {
-                    const response = await fetch('/assistant/ask', {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/json',
-                        },
-                        body: JSON.stringify({
-                            client_id: this.clientId,
-                            question: message,
-                            context_limit: 3
-                        })
-                    });
-
-                    const data = await response.json();
-                    this.hideTypingIndicator();
-
-                    if (data.success) {
-                        this.addMessage(data.answer, 'assistant', data.sources);
-                    } else {
-                        this.addErrorMessage(data.error || 'Произошла ошибка при обработке запроса');
-                    }
-
-                } catch (error) {
-                    this.hideTypingIndicator();
-                    this.addErrorMessage('Ошибка сети. Проверьте подключение к интернету.');
-                    console.error('Ошибка:', error);
-                } finally {
-                    this.setSendingState(false);
-                }
-            }
+# Стили и скрипт чата лежат в static/ и кэшируются браузером; в URL добавляется
+# хэш содержимого, поэтому после изменения файла браузер сразу получит новую версию
+STATIC_DIR = Path(__file__).parent / "static"
+_STATIC_VERSIONS = {
+    filename: hashlib.sha1((STATIC_DIR / filename).read_bytes()).hexdigest()[:12]
+    for filename in ("chat.css", "chat.js")
+}
 
-            addMessage(content, sender, sources = null) {
-                const messageDiv = document.createElement('div');
-                messageDiv.className = `message ${sender}`;
-
-                const avatar = document.createElement('div');
-                avatar.className = 'message-avatar';
-                avatar.textContent = sender === 'user' ? '👤' : '🤖';
-
-                const contentDiv = document.createElement('div');
-                contentDiv.className = 'message-content';
-
-                // Обрабатываем markdown-подобный контент
-                const formattedContent = this.formatMessage(content);
-                contentDiv.innerHTML = formattedContent;
-
-                const timeDiv = document.createElement('div');
-                timeDiv.className = 'message-time';
-                timeDiv.textContent = new Date().toLocaleTimeString('ru-RU', {
-                    hour: '2-digit',
-                    minute: '2-digit'
-                });
-
-                const messageContentWrapper = document.createElement('div');
-                messageContentWrapper.appendChild(contentDiv);
-                messageContentWrapper.appendChild(timeDiv);
-
-                // Добавляем источники для ответов ассистента
-                if (sender === 'assistant' && sources && sources.length > 0) {
-                    const sourcesDiv = document.createElement('div');
-                    sourcesDiv.className = 'message-sources';
-                    sourcesDiv.innerHTML = '<strong>📚 Источники:</strong><br>' + 
-                        sources.map(source => 
-                            `• <a href="${source.url}" target="_blank" class="source-link">${source.file}</a> (${source.category})`
-                        ).join('<br>');
-                    messageContentWrapper.appendChild(sourcesDiv);
-                }
-
-                messageDiv.appendChild(avatar);
-                messageDiv.appendChild(messageContentWrapper);
-
-                this.messagesContainer.appendChild(messageDiv);
-                this.scrollToBottom();
-            }
+# Оболочка страницы чата одинакова для всех клиентов (client_id читает скрипт из URL):
+# подставляем версии ресурсов и сжимаем ее один раз при импорте
+_CHAT_HTML = (
+    (STATIC_DIR / "chat.html").read_text(encoding="utf-8")
+    .replace("__CHAT_CSS_VERSION__", _STATIC_VERSIONS["chat.css"])
+    .replace("__CHAT_JS_VERSION__", _STATIC_VERSIONS["chat.js"])
+    .encode("utf-8")
+)
+_CHAT_HTML_VERSION = hashlib.sha1(_CHAT_HTML).hexdigest()[:12]
+_CHAT_PAGES = {None: _CHAT_HTML, "gzip": gzip.compress(_CHAT_HTML, compresslevel=9)}
+if BROTLI_AVAILABLE:
+    _CHAT_PAGES["br"] = brotli.compress(_CHAT_HTML, quality=11)
 
-            formatMessage(content) {
-    return content
-        .replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>') // **bold**
-        .replace(/🔗 (.*?): (https?:\/\/[^\s]+)/g, '🔗 <a href="$2" target="_blank" class="source-link">$1</a>') // Ссылки
-        .replace(/(https?:\/\/[^\s]+)/g, '<a href="$1" target="_blank" class="source-link">$1</a>') // Обычные ссылки
-}
+# Поддерживаемые сжатия страницы чата в порядке предпочтения
+_CHAT_ENCODINGS = ["br", "gzip"] if BROTLI_AVAILABLE else ["gzip"]
 
-            addErrorMessage(errorText) {
-                const errorDiv = document.createElement('div');
-                errorDiv.className = 'error-message';
-                errorDiv.textContent = `❌ ${errorText}`;
-                this.messagesContainer.appendChild(errorDiv);
-                this.scrollToBottom();
-            }
 
-            showTypingIndicator() {
-                const typingDiv = document.createElement('div');
-                typingDiv.className = 'typing-indicator show';
-                typingDiv.id = 'typingIndicator';
-
-                typingDiv.innerHTML = `
-                    <div class="message-avatar" style="background: #2ecc71; color: white;">🤖</div>
-                    <div style="display: flex; align-items: center; gap: 8px;">
-                        <span>Печатает</span>
-                        <div class="typing-dots">
-                            <div class="typing-dot"></div>
-                            <div class="typing-dot"></div>
-                            <div class="typing-dot"></div>
-                        </div>
-                    </div>
-                `;
-
-                this.messagesContainer.appendChild(typingDiv);
-                this.scrollToBottom();
-            }
+@bp.route('/assistant/chat', methods=['GET'])
+def chat_interface():
+    """Веб-интерфейс для чата с ассистентом (client_id передается параметром URL)"""
+    encoding = request.accept_encodings.best_match(_CHAT_ENCODINGS)
+    response = current_app.response_class(_CHAT_PAGES[encoding], mimetype="text/html")
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
 
-            hideTypingIndicator() {
-                const typingIndicator = document.getElementById('typingIndicator');
-                if (typingIndicator) {
-                    typingIndicator.remove();
-                }
-            }
+    # Браузер перепроверяет страницу при каждом открытии и получает 304 без тела,
+    # пока оболочка не изменилась
+    response.headers["Cache-Control"] = "no-cache"
+    response.set_etag(f"{_CHAT_HTML_VERSION}-{encoding or 'identity'}")
+    return response.make_conditional(request)
 
-            setSendingState(sending) {
-                this.sendButton.disabled = sending;
-                this.messageInput.disabled = sending;
-                this.sendButton.textContent = sending ? '⏳' : '➤';
-            }
 
-            scrollToBottom() {
-                this.messagesContainer.scrollTop = this.messagesContainer.scrollHeight;
-            }
-        }
+@bp.route('/assistant/static/<path:filename>', methods=['GET'])
+def static_files(filename):
+    """Статические файлы чата (CSS/JS)"""
+    response = send_from_directory(STATIC_DIR, filename)
 
-        // Инициализируем чат когда страница загружена
-        document.addEventListener('DOMContentLoaded', () => {
-            new AssistantChat();
-        });
-    </script>
-</body>
-</html>
-    '''
+    # Ответ по URL с актуальным хэшем содержимого не меняется — браузер не перепроверяет его
+    if request.args.get("v") == _STATIC_VERSIONS.get(filename):
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
 
-    return render_template_string(html_template, client_id=client_id)
+    return response
 
 
 @bp.route("/assistant/ask", methods=["POST"])
@@ -675,195 +305,203 @@ def ask():
         "context_limit": 3 (необязательно)
     }
     """
-    try:
-        data = request.get_json()
+    body, error_response = _decode_body(_ASK_DECODER)
+    if error_response is not None:
+        return error_response
 
-        if not data:
-            return jsonify({
-                "success": False,
-                "error": "Нет данных в запросе"
-            }), 400
+    client_id: str = body.client_id
+    question: str = body.question
+    context_limit: int = body.context_limit
 
-        client_id = data.get("client_id")
-        question = data.get("question")
-        context_limit = data.get("context_limit", 3)
+    # Получаем ассистента через менеджер (при промахе кэша загружается индекс)
+    assistant: LKAssistant = assistant_manager.get_assistant(client_id)
 
-        if not client_id:
-            return jsonify({
-                "success": False,
-                "error": "Не указан client_id"
-            }), 400
+    # Embedding вопроса считается вместе с вопросами других запросов этого окна;
+    # на вопрос с готовым ответом embedding не нужен
+    if assistant.is_ready and not assistant.has_cached_answer(question, context_limit):
+        query_batcher.submit(assistant.document_processor.faiss_manager, question).result()
 
-        if not question:
-            return jsonify({
-                "success": False,
-                "error": "Не указан вопрос"
-            }), 400
+    # Задаем вопрос
+    response: Dict[str, Any] = assistant.ask(question, context_limit=context_limit)
 
-        # Получаем ассистента через менеджер
-        assistant = assistant_manager.get_assistant(client_id)
+    # Длина истории в /stats и /health изменилась
+    invalidate_client_cache(client_id, history_only=True)
 
-        # Задаем вопрос
-        response = assistant.ask(question, context_limit=context_limit)
+    # Добавляем информацию о клиенте
+    response['client_id'] = client_id
+    response['assistant_name'] = assistant.assistant_name
 
-        # Добавляем информацию о клиенте
-        response['client_id'] = client_id
-        response['assistant_name'] = assistant.assistant_name
+    return _json(response)
 
-        return jsonify(response)
 
-    except Exception as e:
-        logging.error(f"Ошибка в /assistant/ask: {e}")
-        return jsonify({
-            "success": False,
-            "error": f"Внутренняя ошибка сервера: {str(e)}"
-        }), 500
+def _sse_frame(data) -> bytes:
+    """Кадр Server-Sent Events с JSON-данными"""
+    return b"data: " + _dumps(data) + b"\n\n"
+
+
+@bp.route("/assistant/ask_stream", methods=["POST"])
+def ask_stream():
+    """
+    Вопрос к ассистенту с ответом потоком Server-Sent Events
+
+    Body: как у /assistant/ask
+
+    Кадры:
+        data: {"type": "delta", "text": "..."} — очередной фрагмент ответа
+        data: {"type": "done", ...} — итог: источники и метаданные, как в /assistant/ask, но без answer
+    """
+    body, error_response = _decode_body(_ASK_DECODER)
+    if error_response is not None:
+        return error_response
+
+    client_id: str = body.client_id
+    question: str = body.question
+    context_limit: int = body.context_limit
+
+    assistant: LKAssistant = assistant_manager.get_assistant(client_id)
+
+    if assistant.is_ready and not assistant.has_cached_answer(question, context_limit):
+        query_batcher.submit(assistant.document_processor.faiss_manager, question).result()
+
+    def generate():
+        # Генератор выполняется сервером уже после возврата из view: поиск и
+        # формирование ответа идут по мере отправки, полный ответ не буферизуется
+        try:
+            for event, payload in assistant.ask_stream(question, context_limit=context_limit):
+                if event == "delta":
+                    yield _sse_frame({"type": "delta", "text": payload})
+                else:
+                    payload.pop("answer", None)
+                    payload["type"] = "done"
+                    payload["client_id"] = client_id
+                    payload["assistant_name"] = assistant.assistant_name
+                    yield _sse_frame(payload)
+        except Exception as e:
+            logging.error("Ошибка в /assistant/ask_stream: %s", e)
+            yield _sse_frame({
+                "type": "done",
+                "success": False,
+                "error": f"Внутренняя ошибка сервера: {str(e)}"
+            })
+        finally:
+            # Длина истории в /stats и /health изменилась
+            invalidate_client_cache(client_id, history_only=True)
+
+    return current_app.response_class(
+        generate(),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Отключаем буферизацию ответа в nginx, иначе кадры придут одним блоком
+            "X-Accel-Buffering": "no"
+        }
+    )
 
 
 @bp.route("/assistant/stats", methods=["GET"])
+@response_cached(ttl=30, history_dependent=True)
 def get_stats():
     """
     Получение статистики клиента
 
     Params: client_id
     """
-    try:
-        client_id = request.args.get("client_id")
-
-        if not client_id:
-            return jsonify({
-                "success": False,
-                "error": "Не указан client_id"
-            }), 400
+    client_id: Optional[str] = request.args.get("client_id")
 
-        # Получаем ассистента через менеджер
-        assistant = assistant_manager.get_assistant(client_id)
+    if not client_id:
+        return _error_response(_ERROR_NO_CLIENT_ID)
 
-        # Получаем статистику
-        stats = assistant.get_client_stats()
+    # Получаем ассистента через менеджер
+    assistant: LKAssistant = assistant_manager.get_assistant(client_id)
 
-        return jsonify({
-            "success": True,
-            "stats": stats
-        })
+    # Получаем статистику
+    stats: Dict[str, Any] = assistant.get_client_stats()
 
-    except Exception as e:
-        logging.error(f"Ошибка в /assistant/stats: {e}")
-        return jsonify({
-            "success": False,
-            "error": f"Ошибка получения статистики: {str(e)}"
-        }), 500
+    return _json({
+        "success": True,
+        "stats": stats
+    })
 
 
 @bp.route("/assistant/suggestions", methods=["GET"])
+@response_cached(ttl=120)
 def get_suggestions():
     """
     Получение предлагаемых вопросов
 
     Params: client_id
     """
-    try:
-        client_id = request.args.get("client_id")
-
-        if not client_id:
-            return jsonify({
-                "success": False,
-                "error": "Не указан client_id"
-            }), 400
+    client_id: Optional[str] = request.args.get("client_id")
 
-        # Получаем ассистента через менеджер
-        assistant = assistant_manager.get_assistant(client_id)
+    if not client_id:
+        return _error_response(_ERROR_NO_CLIENT_ID)
 
-        # Получаем предложения
-        suggestions = assistant.suggest_questions()
+    # Получаем ассистента через менеджер
+    assistant: LKAssistant = assistant_manager.get_assistant(client_id)
 
-        return jsonify({
-            "success": True,
-            "suggestions": suggestions,
-            "client_id": client_id
-        })
+    # Получаем предложения
+    suggestions: List[str] = assistant.suggest_questions()
 
-    except Exception as e:
-        logging.error(f"Ошибка в /assistant/suggestions: {e}")
-        return jsonify({
-            "success": False,
-            "error": f"Ошибка получения предложений: {str(e)}"
-        }), 500
+    return _json({
+        "success": True,
+        "suggestions": suggestions,
+        "client_id": client_id
+    })
 
 
 @bp.route("/assistant/categories", methods=["GET"])
+@response_cached(ttl=120)
 def get_categories():
     """
     Получение списка доступных категорий документов
 
     Params: client_id
     """
-    try:
-        client_id = request.args.get("client_id")
-
-        if not client_id:
-            return jsonify({
-                "success": False,
-                "error": "Не указан client_id"
-            }), 400
+    client_id: Optional[str] = request.args.get("client_id")
 
-        # Получаем ассистента через менеджер
-        assistant = assistant_manager.get_assistant(client_id)
+    if not client_id:
+        return _error_response(_ERROR_NO_CLIENT_ID)
 
-        # Получаем категории
-        categories = assistant.get_available_categories()
+    # Получаем ассистента через менеджер
+    assistant: LKAssistant = assistant_manager.get_assistant(client_id)
 
-        return jsonify({
-            "success": True,
-            "categories": categories,
-            "client_id": client_id,
-            "total_categories": len(categories)
-        })
+    # Получаем категории
+    categories: List[str] = assistant.get_available_categories()
 
-    except Exception as e:
-        logging.error(f"Ошибка в /assistant/categories: {e}")
-        return jsonify({
-            "success": False,
-            "error": f"Ошибка получения категорий: {str(e)}"
-        }), 500
+    return _json({
+        "success": True,
+        "categories": categories,
+        "client_id": client_id,
+        "total_categories": len(categories)
+    })
 
 
 @bp.route("/assistant/recent_documents", methods=["GET"])
+@response_cached(ttl=60)
 def get_recent_documents():
     """
     Получение списка недавних документов
 
     Params: client_id, limit (необязательно, по умолчанию 5)
     """
-    try:
-        client_id = request.args.get("client_id")
-        limit = request.args.get("limit", 5, type=int)
+    client_id: Optional[str] = request.args.get("client_id")
+    limit: int = request.args.get("limit", 5, type=int)
 
-        if not client_id:
-            return jsonify({
-                "success": False,
-                "error": "Не указан client_id"
-            }), 400
+    if not client_id:
+        return _error_response(_ERROR_NO_CLIENT_ID)
 
-        # Получаем ассистента через менеджер
-        assistant = assistant_manager.get_assistant(client_id)
+    # Получаем ассистента через менеджер
+    assistant: LKAssistant = assistant_manager.get_assistant(client_id)
 
-        # Получаем недавние документы
-        recent_docs = assistant.get_recent_documents(limit=limit)
+    # Получаем недавние документы
+    recent_docs: List[Dict[str, Any]] = assistant.get_recent_documents(limit=limit)
 
-        return jsonify({
-            "success": True,
-            "recent_documents": recent_docs,
-            "client_id": client_id,
-            "limit": limit
-        })
-
-    except Exception as e:
-        logging.error(f"Ошибка в /assistant/recent_documents: {e}")
-        return jsonify({
-            "success": False,
-            "error": f"Ошибка получения недавних документов: {str(e)}"
-        }), 500
+    return _json({
+        "success": True,
+        "recent_documents": recent_docs,
+        "client_id": client_id,
+        "limit": limit
+    })
 
 
 @bp.route("/assistant/history", methods=["GET"])
@@ -873,35 +511,24 @@ def get_history():
 
     Params: client_id, limit (необязательно)
     """
-    try:
-        client_id = request.args.get("client_id")
-        limit = request.args.get("limit", 10, type=int)
+    client_id: Optional[str] = request.args.get("client_id")
+    limit: int = request.args.get("limit", 10, type=int)
 
-        if not client_id:
-            return jsonify({
-                "success": False,
-                "error": "Не указан client_id"
-            }), 400
+    if not client_id:
+        return _error_response(_ERROR_NO_CLIENT_ID)
 
-        # Получаем ассистента через менеджер
-        assistant = assistant_manager.get_assistant(client_id)
+    # Получаем ассистента через менеджер
+    assistant: LKAssistant = assistant_manager.get_assistant(client_id)
 
-        # Получаем историю
-        history = assistant.get_conversation_history(limit=limit)
+    # Получаем историю
+    history: List[Dict[str, Any]] = assistant.get_conversation_history(limit=limit)
 
-        return jsonify({
-            "success": True,
-            "history": history,
-            "total_messages": len(assistant.conversation_history),
-            "client_id": client_id
-        })
-
-    except Exception as e:
-        logging.error(f"Ошибка в /assistant/history: {e}")
-        return jsonify({
-            "success": False,
-            "error": f"Ошибка получения истории: {str(e)}"
-        }), 500
+    return _json({
+        "success": True,
+        "history": history,
+        "total_messages": len(assistant.conversation_history),
+        "client_id": client_id
+    })
 
 
 @bp.route("/assistant/clear_history", methods=["POST"])
@@ -911,34 +538,24 @@ def clear_history():
 
     Body: {"client_id": "uuid"}
     """
-    try:
-        data = request.get_json()
-        client_id = data.get("client_id") if data else None
+    body, error_response = _decode_body(_CLIENT_DECODER)
+    if error_response is not None:
+        return error_response
 
-        if not client_id:
-            return jsonify({
-                "success": False,
-                "error": "Не указан client_id"
-            }), 400
+    client_id: str = body.client_id
 
-        # Получаем ассистента через менеджер
-        assistant = assistant_manager.get_assistant(client_id)
+    # Получаем ассистента через менеджер
+    assistant: LKAssistant = assistant_manager.get_assistant(client_id)
 
-        # Очищаем историю
-        assistant.clear_history()
+    # Очищаем историю
+    assistant.clear_history()
+    invalidate_client_cache(client_id, history_only=True)
 
-        return jsonify({
-            "success": True,
-            "message": "История разговора очищена",
-            "client_id": client_id
-        })
-
-    except Exception as e:
-        logging.error(f"Ошибка в /assistant/clear_history: {e}")
-        return jsonify({
-            "success": False,
-            "error": f"Ошибка очистки истории: {str(e)}"
-        }), 500
+    return _json({
+        "success": True,
+        "message": "История разговора очищена",
+        "client_id": client_id
+    })
 
 
 @bp.route("/assistant/search_category", methods=["POST"])
@@ -952,42 +569,24 @@ def search_by_category():
         "category": "название категории"
     }
     """
-    try:
-        data = request.get_json()
+    body, error_response = _decode_body(_SEARCH_CATEGORY_DECODER)
+    if error_response is not None:
+        return error_response
 
-        if not data:
-            return jsonify({
-                "success": False,
-                "error": "Нет данных в запросе"
-            }), 400
+    client_id: str = body.client_id
+    query: str = body.query
+    category: str = body.category
 
-        client_id = data.get("client_id")
-        query = data.get("query")
-        category = data.get("category")
+    # Получаем ассистента через менеджер
+    assistant: LKAssistant = assistant_manager.get_assistant(client_id)
 
-        if not all([client_id, query, category]):
-            return jsonify({
-                "success": False,
-                "error": "Не указаны обязательные поля: client_id, query, category"
-            }), 400
+    # Выполняем поиск
+    result: Dict[str, Any] = assistant.search_by_category(query, category)
 
-        # Получаем ассистента через менеджер
-        assistant = assistant_manager.get_assistant(client_id)
-
-        # Выполняем поиск
-        result = assistant.search_by_category(query, category)
+    # Добавляем информацию о клиенте
+    result['client_id'] = client_id
 
-        # Добавляем информацию о клиенте
-        result['client_id'] = client_id
-
-        return jsonify(result)
-
-    except Exception as e:
-        logging.error(f"Ошибка в /assistant/search_category: {e}")
-        return jsonify({
-            "success": False,
-            "error": f"Ошибка поиска: {str(e)}"
-        }), 500
+    return _json(result)
 
 
 @bp.route("/assistant/reload", methods=["POST"])
@@ -997,36 +596,48 @@ def reload_assistant():
 
     Body: {"client_id": "uuid"}
     """
-    try:
-        data = request.get_json()
-        client_id = data.get("client_id") if data else None
+    body, error_response = _decode_body(_CLIENT_DECODER)
+    if error_response is not None:
+        return error_response
+
+    client_id: str = body.client_id
+
+    # Перезагружаем ассистента через менеджер
+    assistant: LKAssistant = assistant_manager.get_assistant(client_id, force_reload=True)
+    invalidate_client_cache(client_id)
+
+    return _json({
+        "success": True,
+        "message": "Ассистент перезагружен",
+        "client_id": client_id,
+        "is_ready": assistant.is_ready,
+        "stats": assistant.get_client_stats()
+    })
 
-        if not client_id:
-            return jsonify({
-                "success": False,
-                "error": "Не указан client_id"
-            }), 400
 
-        # Перезагружаем ассистента через менеджер
-        assistant = assistant_manager.get_assistant(client_id, force_reload=True)
+def _build_health_status(client_id: str, assistant: LKAssistant) -> Dict[str, Any]:
+    """Проверяет статус ассистента"""
+    health_status: Dict[str, Any] = {
+        "client_id": client_id,
+        "is_ready": assistant.is_ready,
+        "assistant_name": assistant.assistant_name,
+        "has_conversation_history": len(assistant.conversation_history) > 0,
+        "service_status": "healthy"
+    }
 
-        return jsonify({
-            "success": True,
-            "message": "Ассистент перезагружен",
-            "client_id": client_id,
-            "is_ready": assistant.is_ready,
-            "stats": assistant.get_client_stats()
+    if assistant.is_ready:
+        stats: Dict[str, Any] = assistant.get_client_stats()
+        health_status.update({
+            "total_documents": stats.get('total_documents', 0),
+            "total_chunks": stats.get('total_chunks', 0),
+            "categories_count": len(stats.get('categories', []))
         })
 
-    except Exception as e:
-        logging.error(f"Ошибка в /assistant/reload: {e}")
-        return jsonify({
-            "success": False,
-            "error": f"Ошибка перезагрузки: {str(e)}"
-        }), 500
+    return health_status
 
 
 @bp.route("/assistant/health", methods=["GET"])
+@response_cached(ttl=10, history_dependent=True)
 def health_check():
     """
     Проверка здоровья ассистента для конкретного клиента
@@ -1034,73 +645,73 @@ def health_check():
     Params: client_id
     """
     try:
-        client_id = request.args.get("client_id")
+        client_id: Optional[str] = request.args.get("client_id")
 
         if not client_id:
-            return jsonify({
-                "success": False,
-                "error": "Не указан client_id"
-            }), 400
+            return _error_response(_ERROR_NO_CLIENT_ID)
 
         # Получаем ассистента через менеджер
-        assistant = assistant_manager.get_assistant(client_id)
-
-        # Проверяем статус
-        health_status = {
-            "client_id": client_id,
-            "is_ready": assistant.is_ready,
-            "assistant_name": assistant.assistant_name,
-            "has_conversation_history": len(assistant.conversation_history) > 0,
-            "service_status": "healthy"
-        }
-
-        if assistant.is_ready:
-            stats = assistant.get_client_stats()
-            health_status.update({
-                "total_documents": stats.get('total_documents', 0),
-                "total_chunks": stats.get('total_chunks', 0),
-                "categories_count": len(stats.get('categories', []))
-            })
+        assistant: LKAssistant = assistant_manager.get_assistant(client_id)
 
-        return jsonify({
+        return _json({
             "success": True,
-            "health": health_status
+            "health": _build_health_status(client_id, assistant)
         })
 
     except Exception as e:
-        logging.error(f"Ошибка в /assistant/health: {e}")
-        return jsonify({
+        logging.error("Ошибка в /assistant/health: %s", e)
+        return _json({
             "success": False,
             "health": {
                 "client_id": client_id,
                 "service_status": "unhealthy",
                 "error": str(e)
             }
-        }), 500
+        }, 500)
+
+
+@bp.route("/assistant/bootstrap", methods=["GET"])
+@response_cached(ttl=10, history_dependent=True)
+def bootstrap():
+    """
+    Данные для первой отрисовки чата одним запросом: статус ассистента и предлагаемые вопросы
+
+    Params: client_id
+    """
+    client_id: Optional[str] = request.args.get("client_id")
+
+    if not client_id:
+        return _error_response(_ERROR_NO_CLIENT_ID)
+
+    # Один поиск ассистента на оба ответа
+    assistant: LKAssistant = assistant_manager.get_assistant(client_id)
+
+    health_status: Dict[str, Any] = _build_health_status(client_id, assistant)
+    suggestions: List[str] = assistant.suggest_questions()
+
+    return _json({
+        "success": True,
+        "health": health_status,
+        "suggestions": suggestions,
+        "client_id": client_id
+    })
 
 
 @bp.route("/assistant/manager_stats", methods=["GET"])
+@response_cached(ttl=2)
 def get_manager_stats():
     """
     Получение статистики менеджера ассистентов
     """
-    try:
-        cache_stats = assistant_manager.get_cache_stats()
-        active_assistants = assistant_manager.list_active_assistants()
-
-        return jsonify({
-            "success": True,
-            "manager_stats": cache_stats,
-            "active_assistants": active_assistants,
-            "active_count": len(active_assistants)
-        })
-
-    except Exception as e:
-        logging.error(f"Ошибка в /assistant/manager_stats: {e}")
-        return jsonify({
-            "success": False,
-            "error": f"Ошибка получения статистики менеджера: {str(e)}"
-        }), 500
+    cache_stats: Dict[str, Any] = assistant_manager.get_cache_stats()
+    active_assistants: Dict[str, Dict[str, Any]] = assistant_manager.list_active_assistants()
+
+    return _json({
+        "success": True,
+        "manager_stats": cache_stats,
+        "active_assistants": active_assistants,
+        "active_count": len(active_assistants)
+    })
 
 
 @bp.route("/assistant/clear_cache", methods=["POST"])
@@ -1110,29 +721,100 @@ def clear_cache():
 
     Body: {"confirm": true} (обязательно для безопасности)
     """
-    try:
-        data = request.get_json()
+    body, error_response = _decode_body(_CLEAR_CACHE_DECODER)
+    if error_response is not None:
+        return error_response
+
+    if not body.confirm:
+        return _error_response(_ERROR_CLEAR_CACHE_NOT_CONFIRMED)
+
+    cleared_count: int = assistant_manager.clear_all_cache()
+    invalidate_client_cache()
+
+    return _json({
+        "success": True,
+        "message": f"Кэш очищен, удалено {cleared_count} ассистентов",
+        "cleared_assistants": cleared_count
+    })
+
+
+def _bulk_reload(client_id: str) -> dict:
+    assistant: LKAssistant = assistant_manager.get_assistant(client_id, force_reload=True)
+    invalidate_client_cache(client_id)
+    return {
+        "success": True,
+        "is_ready": assistant.is_ready
+    }
 
-        if not data or not data.get("confirm"):
-            return jsonify({
-                "success": False,
-                "error": "Для очистки кэша требуется подтверждение: {\"confirm\": true}"
-            }), 400
 
-        cleared_count = assistant_manager.clear_all_cache()
+def _bulk_stats(client_id: str) -> dict:
+    assistant: LKAssistant = assistant_manager.get_assistant(client_id)
+    return {
+        "success": True,
+        "stats": assistant.get_client_stats()
+    }
 
-        return jsonify({
+
+def _bulk_stats_loaded(assistant: LKAssistant, client_id: str) -> dict:
+    return {
+        "success": True,
+        "stats": assistant.get_client_stats()
+    }
+
+
+def _bulk_health(client_id: str, force: bool = False) -> dict:
+    assistant_info = assistant_manager.get_assistant_info(client_id)
+    if assistant_info:
+        return {
             "success": True,
-            "message": f"Кэш очищен, удалено {cleared_count} ассистентов",
-            "cleared_assistants": cleared_count
-        })
+            "health": assistant_info,
+            "cached": True
+        }
+
+    if not force:
+        # Создание ассистента загружает индекс — проверка здоровья этого не делает
+        return {
+            "success": True,
+            "health": {
+                "is_ready": False,
+                "cached": False
+            }
+        }
+
+    # Создаем ассистента для проверки (явный запрос с "force": true)
+    assistant: LKAssistant = assistant_manager.get_assistant(client_id)
+    return {
+        "success": True,
+        "health": {
+            "is_ready": assistant.is_ready,
+            "cached": False
+        }
+    }
 
+
+# Обработчики массовых операций: результат для одного клиента
+_BULK_OPERATIONS = {
+    "reload_all": _bulk_reload,
+    "get_all_stats": _bulk_stats,
+    "health_check_all": _bulk_health,
+}
+
+# Клиенты массовой операции обрабатываются параллельно: загрузка индексов — в основном I/O
+_bulk_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("BULK_WORKERS", "16")), thread_name_prefix="bulk-operations"
+)
+
+
+def _run_bulk_handler(handler, client_id: str) -> dict:
+    """Результат операции для клиента; ошибка одного клиента не прерывает остальных"""
+    try:
+        result = handler(client_id)
     except Exception as e:
-        logging.error(f"Ошибка в /assistant/clear_cache: {e}")
-        return jsonify({
+        result = {
             "success": False,
-            "error": f"Ошибка очистки кэша: {str(e)}"
-        }), 500
+            "error": str(e)
+        }
+    return {"client_id": client_id, **result}
 
 
 @bp.route("/assistant/bulk_operations", methods=["POST"])
@@ -1142,98 +824,75 @@ def bulk_operations():
 
     Body: {
         "operation": "reload_all" | "get_all_stats" | "health_check_all",
-        "client_ids": ["client1", "client2", ...] (опционально)
+        "client_ids": ["client1", "client2", ...] (опционально),
+        "force": true (опционально, для health_check_all: создать незагруженных ассистентов),
+        "max_concurrency": 4 (опционально, сколько клиентов обрабатывать одновременно)
     }
+
+    Ответ — NDJSON (application/x-ndjson): строка {"client_id": ..., "success": ...}
+    на каждого клиента по мере готовности (клиенты обрабатываются параллельно), последняя строка —
+    {"success": true, "operation": ..., "processed_clients": N}
     """
-    try:
-        data = request.get_json()
+    body, error_response = _decode_body(_BULK_DECODER)
+    if error_response is not None:
+        return error_response
 
-        if not data or not data.get("operation"):
-            return jsonify({
-                "success": False,
-                "error": "Не указана операция"
-            }), 400
-
-        operation = data.get("operation")
-        client_ids = data.get("client_ids", [])
-
-        # Если client_ids не указаны, берем всех активных
-        if not client_ids:
-            active_assistants = assistant_manager.list_active_assistants()
-            client_ids = list(active_assistants.keys())
-
-        results = {}
-
-        if operation == "reload_all":
-            for client_id in client_ids:
-                try:
-                    assistant = assistant_manager.get_assistant(client_id, force_reload=True)
-                    results[client_id] = {
-                        "success": True,
-                        "is_ready": assistant.is_ready
-                    }
-                except Exception as e:
-                    results[client_id] = {
-                        "success": False,
-                        "error": str(e)
-                    }
-
-        elif operation == "get_all_stats":
-            for client_id in client_ids:
-                try:
-                    assistant = assistant_manager.get_assistant(client_id)
-                    results[client_id] = {
-                        "success": True,
-                        "stats": assistant.get_client_stats()
-                    }
-                except Exception as e:
-                    results[client_id] = {
-                        "success": False,
-                        "error": str(e)
-                    }
-
-        elif operation == "health_check_all":
-            for client_id in client_ids:
-                try:
-                    assistant_info = assistant_manager.get_assistant_info(client_id)
-                    if assistant_info:
-                        results[client_id] = {
-                            "success": True,
-                            "health": assistant_info,
-                            "cached": True
-                        }
-                    else:
-                        # Пробуем создать ассистента для проверки
-                        assistant = assistant_manager.get_assistant(client_id)
-                        results[client_id] = {
-                            "success": True,
-                            "health": {
-                                "is_ready": assistant.is_ready,
-                                "cached": False
-                            }
-                        }
-                except Exception as e:
-                    results[client_id] = {
-                        "success": False,
-                        "error": str(e)
-                    }
-
-        else:
-            return jsonify({
-                "success": False,
-                "error": f"Неизвестная операция: {operation}"
-            }), 400
+    operation: str = body.operation
+    client_ids: List[str] = body.client_ids
+    max_concurrency: Optional[int] = body.max_concurrency
+
+    handler = _BULK_OPERATIONS.get(operation)
+    if handler is None:
+        return _json({
+            "success": False,
+            "error": f"Неизвестная операция: {operation}"
+        }, 400)
+    if handler is _bulk_health and body.force:
+        handler = partial(_bulk_health, force=True)
+
+    # Если client_ids не указаны, берем всех активных
+    if not client_ids:
+        active_assistants: Dict[str, Dict[str, Any]] = assistant_manager.list_active_assistants()
+        client_ids = list(active_assistants.keys())
+    else:
+        # Повторы одного клиента выполнялись бы параллельно друг с другом
+        client_ids = list(dict.fromkeys(client_ids))
+
+    def generate():
+        tasks = [(handler, client_id) for client_id in client_ids]
+        if handler is _bulk_stats:
+            # Загруженных ассистентов находим одним проходом по кэшу менеджера:
+            # их статистика считается без повторного поиска, незагруженные создаются
+            loaded = assistant_manager.get_loaded_assistants(client_ids)
+            tasks = [
+                (partial(_bulk_stats_loaded, loaded[client_id]) if client_id in loaded else handler, client_id)
+                for client_id in client_ids
+            ]
+
+        # Результат клиента отправляется по готовности, не накапливаясь в общем словаре;
+        # порядок строк — порядок завершения, а не порядок client_ids.
+        # Одновременно выполняется не больше max_concurrency клиентов: следующий
+        # ставится в пул, когда завершается один из текущих
+        queued = iter(tasks)
+        running = {
+            _bulk_pool.submit(_run_bulk_handler, task_handler, client_id)
+            for task_handler, client_id in islice(queued, max_concurrency)
+        }
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield _dumps(future.result()) + b"\n"
+            running |= {
+                _bulk_pool.submit(_run_bulk_handler, task_handler, client_id)
+                for task_handler, client_id in islice(queued, len(done))
+            }
 
-        return jsonify({
+        yield _dumps({
             "success": True,
             "operation": operation,
-            "processed_clients": len(client_ids),
-            "results": results
-        })
+            "processed_clients": len(client_ids)
+        }) + b"\n"
 
-    except Exception as e:
-        logging.error(f"Ошибка в /assistant/bulk_operations: {e}")
-        return jsonify({
-            "success": False,
-            "error": f"Ошибка массовой операции: {str(e)}"
-        }), 500
\ No newline at end of file
+    return current_app.response_class(
+        stream_with_context(generate()), mimetype="application/x-ndjson"
+    )
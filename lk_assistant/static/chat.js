@@ -0,0 +1,286 @@
+// Клиент по умолчанию, если client_id не передан в адресе страницы
+const DEFAULT_CLIENT_ID = '6a2502fa-caaa-11e3-9af3-e41f13beb1d2';
+
+// Разметка сообщений, альтернативы проверяются в этом порядке
+const MESSAGE_FORMAT_RE = /\*\*(.*?)\*\*|🔗 (.*?): (https?:\/\/[^\s]+)|(https?:\/\/[^\s]+)/g;
+
+class AssistantChat {
+    constructor() {
+        this.clientId = new URLSearchParams(window.location.search).get('client_id') || DEFAULT_CLIENT_ID;
+        this.messagesContainer = document.getElementById('chatMessages');
+        this.messageInput = document.getElementById('messageInput');
+        this.sendButton = document.getElementById('sendButton');
+        this.statusElement = document.getElementById('status');
+        this.suggestionsContainer = document.getElementById('suggestions');
+
+        this.init();
+    }
+
+    init() {
+        this.setupEventListeners();
+        this.bootstrap();
+    }
+
+    setupEventListeners() {
+        this.sendButton.addEventListener('click', () => this.sendMessage());
+
+        this.messageInput.addEventListener('keydown', (e) => {
+            if (e.key === 'Enter' && !e.shiftKey) {
+                e.preventDefault();
+                this.sendMessage();
+            }
+        });
+
+        // Автоматическое изменение высоты textarea
+        this.messageInput.addEventListener('input', (e) => {
+            e.target.style.height = 'auto';
+            e.target.style.height = e.target.scrollHeight + 'px';
+        });
+    }
+
+    async bootstrap() {
+        // Статус и предложения приходят одним запросом
+        try {
+            const response = await fetch(`/assistant/bootstrap?client_id=${encodeURIComponent(this.clientId)}`);
+            const data = await response.json();
+
+            this.updateStatus(data.success ? data.health : null);
+
+            if (data.success && data.suggestions) {
+                this.renderSuggestions(data.suggestions.slice(0, 4)); // Показываем первые 4
+            }
+        } catch (error) {
+            this.statusElement.textContent = '🔴 Ошибка';
+            this.statusElement.style.background = 'rgba(231, 76, 60, 0.2)';
+            console.error('Ошибка инициализации чата:', error);
+        }
+    }
+
+    updateStatus(health) {
+        if (health && health.is_ready) {
+            this.statusElement.textContent = '🟢 Готов к работе';
+            this.statusElement.style.background = 'rgba(46, 204, 113, 0.2)';
+        } else {
+            this.statusElement.textContent = '🟡 Нет данных';
+            this.statusElement.style.background = 'rgba(241, 196, 15, 0.2)';
+        }
+    }
+
+    renderSuggestions(suggestions) {
+        this.suggestionsContainer.innerHTML = '';
+
+        suggestions.forEach(suggestion => {
+            const chip = document.createElement('button');
+            chip.className = 'suggestion-chip';
+            chip.textContent = suggestion;
+            chip.addEventListener('click', () => {
+                this.messageInput.value = suggestion;
+                this.sendMessage();
+            });
+            this.suggestionsContainer.appendChild(chip);
+        });
+    }
+
+    async sendMessage() {
+        const message = this.messageInput.value.trim();
+        if (!message || this.sendButton.disabled) return;
+
+        // Добавляем сообщение пользователя
+        this.addMessage(message, 'user');
+
+        // Очищаем поле ввода и блокируем кнопку
+        this.messageInput.value = '';
+        this.messageInput.style.height = 'auto';
+        this.setSendingState(true);
+
+        // Показываем индикатор печати
+        this.showTypingIndicator();
+
+        try {
+            const response = await fetch('/assistant/ask_stream', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({
+                    client_id: this.clientId,
+                    question: message,
+                    context_limit: 3
+                })
+            });
+
+            if (!response.ok || !response.body) {
+                const data = await response.json();
+                this.hideTypingIndicator();
+                this.addErrorMessage(data.error || 'Произошла ошибка при обработке запроса');
+                return;
+            }
+
+            await this.readAnswerStream(response.body);
+        } catch (error) {
+            this.hideTypingIndicator();
+            this.addErrorMessage('Ошибка сети. Проверьте подключение к интернету.');
+            console.error('Ошибка:', error);
+        } finally {
+            this.setSendingState(false);
+        }
+    }
+
+    async readAnswerStream(body) {
+        // Кадры Server-Sent Events: фрагменты ответа, затем итог с источниками
+        const reader = body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let text = '';
+        let message = null;
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+
+            buffer += decoder.decode(value, { stream: true });
+            const frames = buffer.split('\n\n');
+            buffer = frames.pop();
+
+            for (const frame of frames) {
+                if (!frame.startsWith('data: ')) continue;
+                const data = JSON.parse(frame.slice(6));
+
+                if (data.type === 'delta') {
+                    if (!message) {
+                        this.hideTypingIndicator();
+                        message = this.addMessage('', 'assistant');
+                    }
+                    text += data.text;
+                    message.content.innerHTML = this.formatMessage(text);
+                    this.scrollToBottom();
+                } else if (data.type === 'done') {
+                    this.hideTypingIndicator();
+                    if (data.success) {
+                        if (!message) {
+                            message = this.addMessage('', 'assistant');
+                        }
+                        this.addSources(message.wrapper, data.sources);
+                    } else {
+                        this.addErrorMessage(data.error || 'Произошла ошибка при обработке запроса');
+                    }
+                }
+            }
+        }
+
+        this.hideTypingIndicator();
+    }
+
+    addMessage(content, sender, sources = null) {
+        const messageDiv = document.createElement('div');
+        messageDiv.className = `message ${sender}`;
+
+        const avatar = document.createElement('div');
+        avatar.className = 'message-avatar';
+        avatar.textContent = sender === 'user' ? '👤' : '🤖';
+
+        const contentDiv = document.createElement('div');
+        contentDiv.className = 'message-content';
+
+        // Обрабатываем markdown-подобный контент
+        const formattedContent = this.formatMessage(content);
+        contentDiv.innerHTML = formattedContent;
+
+        const timeDiv = document.createElement('div');
+        timeDiv.className = 'message-time';
+        timeDiv.textContent = new Date().toLocaleTimeString('ru-RU', {
+            hour: '2-digit',
+            minute: '2-digit'
+        });
+
+        const messageContentWrapper = document.createElement('div');
+        messageContentWrapper.appendChild(contentDiv);
+        messageContentWrapper.appendChild(timeDiv);
+
+        // Добавляем источники для ответов ассистента
+        if (sender === 'assistant') {
+            this.addSources(messageContentWrapper, sources);
+        }
+
+        messageDiv.appendChild(avatar);
+        messageDiv.appendChild(messageContentWrapper);
+
+        this.messagesContainer.appendChild(messageDiv);
+        this.scrollToBottom();
+
+        return { content: contentDiv, wrapper: messageContentWrapper };
+    }
+
+    addSources(wrapper, sources) {
+        if (!sources || sources.length === 0) return;
+
+        const sourcesDiv = document.createElement('div');
+        sourcesDiv.className = 'message-sources';
+        sourcesDiv.innerHTML = '<strong>📚 Источники:</strong><br>' + 
+            sources.map(source => 
+                `• <a href="${source.url}" target="_blank" class="source-link">${source.file}</a> (${source.category})`
+            ).join('<br>');
+        wrapper.appendChild(sourcesDiv);
+        this.scrollToBottom();
+    }
+
+    formatMessage(content) {
+        // Один проход по строке: **bold**, "🔗 название: url" и обычные ссылки
+        return content.replace(MESSAGE_FORMAT_RE, (match, bold, linkTitle, linkUrl, url) => {
+            if (bold !== undefined) return `<strong>${bold}</strong>`;
+            if (linkTitle !== undefined) return `🔗 <a href="${linkUrl}" target="_blank" class="source-link">${linkTitle}</a>`;
+            return `<a href="${url}" target="_blank" class="source-link">${url}</a>`;
+        });
+    }
+
+    addErrorMessage(errorText) {
+        const errorDiv = document.createElement('div');
+        errorDiv.className = 'error-message';
+        errorDiv.textContent = `❌ ${errorText}`;
+        this.messagesContainer.appendChild(errorDiv);
+        this.scrollToBottom();
+    }
+
+    showTypingIndicator() {
+        const typingDiv = document.createElement('div');
+        typingDiv.className = 'typing-indicator show';
+        typingDiv.id = 'typingIndicator';
+
+        typingDiv.innerHTML = `
+            <div class="message-avatar" style="background: #2ecc71; color: white;">🤖</div>
+            <div style="display: flex; align-items: center; gap: 8px;">
+                <span>Печатает</span>
+                <div class="typing-dots">
+                    <div class="typing-dot"></div>
+                    <div class="typing-dot"></div>
+                    <div class="typing-dot"></div>
+                </div>
+            </div>
+        `;
+
+        this.messagesContainer.appendChild(typingDiv);
+        this.scrollToBottom();
+    }
+
+    hideTypingIndicator() {
+        const typingIndicator = document.getElementById('typingIndicator');
+        if (typingIndicator) {
+            typingIndicator.remove();
+        }
+    }
+
+    setSendingState(sending) {
+        this.sendButton.disabled = sending;
+        this.messageInput.disabled = sending;
+        this.sendButton.textContent = sending ? '⏳' : '➤';
+    }
+
+    scrollToBottom() {
+        this.messagesContainer.scrollTop = this.messagesContainer.scrollHeight;
+    }
+}
+
+// Инициализируем чат когда страница загружена
+document.addEventListener('DOMContentLoaded', () => {
+    new AssistantChat();
+});
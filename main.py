@@ -1,16 +1,49 @@
-from flask import Flask, jsonify
-import importlib
+import gzip
+import logging
+import os
+
+from flask import Flask, jsonify, request
+from faiss_vs.routes import bp as faiss_bp
+from lk_assistant.routes import bp as lk_assistant_bp
+
+# Модули при импорте настраивают логирование на INFO; force заменяет эту настройку.
+# Записи ниже LOG_LEVEL отбрасываются до форматирования сообщения
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "WARNING").upper(),
+    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+    force=True
+)
 
 app = Flask(__name__)
 
+# JSON-ответы больше порога сжимаются gzip (статистика, списки чанков и т.п.)
+GZIP_MIN_JSON_SIZE = 64 * 1024
+
 @app.route("/", strict_slashes=False)
 def root():
     return jsonify({"status": "ok", "message": "Главная страница API"})
 
 # Подключаем роуты
-for module_name in ["faiss_vs.routes", "lk_assistant.routes"]:
-    mod = importlib.import_module(module_name)
-    app.register_blueprint(mod.bp)
+app.register_blueprint(faiss_bp)
+app.register_blueprint(lk_assistant_bp)
+
+
+@app.after_request
+def compress_large_json(response):
+    """Сжимает крупный JSON-ответ, если клиент принимает gzip"""
+    if (
+        response.mimetype != "application/json"
+        or response.is_streamed
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+
+    body = response.get_data()
+    if len(body) < GZIP_MIN_JSON_SIZE or not request.accept_encodings["gzip"]:
+        return response
 
-if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8000, debug=True)
+    response.set_data(gzip.compress(body, compresslevel=6))
+    response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    return response